@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Approximate nearest-neighbour (IVF) index over the subgenre prototypes.
+Prototypes are clustered with spherical k-means; a query is scored exactly
+only against the rows in its `nprobe` closest clusters. Raising nprobe trades
+latency for recall (nprobe = nlist is exact).
+
+The index is persisted next to the database (subgenres.ivf.npz) and is tied
+to the DB mtime and row count it was built from.
+
+Usage:
+    python3 ann_index.py build [--nlist 64]
+    python3 ann_index.py report [--nprobe 1 2 4 8] [--queries /tmp/n8n_chunks.json]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from chunk_reader import iter_chunks
+from prototype_store import get_store
+from similarity_engine import TOP_K, l2_normalize, score_matrix, stack_embeddings
+from subgenres_db import DB_PATH
+
+DEFAULT_NPROBE = 8
+# Queries searched together
+SEARCH_BLOCK = 256
+
+
+def index_path(db_path=DB_PATH):
+    """Index file stored alongside the database."""
+    db_path = Path(db_path)
+    return db_path.with_name(db_path.stem + '.ivf.npz')
+
+
+def spherical_kmeans(matrix, nlist, iterations=20, seed=0):
+    """Cluster unit vectors by cosine similarity; returns (centroids, assignments)."""
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), nlist, replace=False)].copy()
+    assignments = None
+
+    for _ in range(iterations):
+        new_assignments = np.argmax(matrix @ centroids.T, axis=1)
+        if assignments is not None and np.array_equal(new_assignments, assignments):
+            break
+        assignments = new_assignments
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, matrix)
+        empty = np.bincount(assignments, minlength=nlist) == 0
+        # Re-seed empty clusters from random rows
+        sums[empty] = matrix[rng.choice(len(matrix), int(empty.sum()), replace=False)]
+        centroids = l2_normalize(sums)
+
+    # Final lists must match the final centroids
+    return centroids, np.argmax(matrix @ centroids.T, axis=1)
+
+
+class IVFIndex:
+    """Inverted-file index: cluster centroids plus the prototype rows in each cluster."""
+
+    def __init__(self, centroids, order, offsets, source_count, source_mtime):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.source_count = source_count
+        self.source_mtime = source_mtime
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, prototypes, nlist=None, source_mtime=None, seed=0):
+        """Cluster a prototype matrix into nlist inverted lists (default ~sqrt(n))."""
+        n = len(prototypes)
+        nlist = min(n, nlist or max(1, int(np.sqrt(n))))
+        centroids, assignments = spherical_kmeans(prototypes.matrix, nlist, seed=seed)
+        order = np.argsort(assignments, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=nlist))])
+        return cls(centroids, order, offsets, n, source_mtime)
+
+    def save(self, path):
+        np.savez(
+            path,
+            centroids=self.centroids,
+            order=self.order,
+            offsets=self.offsets,
+            source=np.array([self.source_count, self.source_mtime or 0], dtype=np.float64)
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            count, mtime = data['source']
+            return cls(data['centroids'], data['order'], data['offsets'], int(count), float(mtime) or None)
+
+    def matches(self, store):
+        """True if the index was built from the DB snapshot currently loaded in the store."""
+        return self.source_count == store.count and self.source_mtime == store.mtime
+
+    def _clustered(self, prototype_matrix):
+        """Prototype rows reordered so every inverted list is a contiguous slice (cached)."""
+        if getattr(self, '_clustered_source', None) is not prototype_matrix:
+            self._clustered_matrix = np.ascontiguousarray(prototype_matrix[self.order])
+            self._clustered_source = prototype_matrix
+        return self._clustered_matrix
+
+    def search(self, embeddings, prototype_matrix, k=TOP_K, nprobe=DEFAULT_NPROBE):
+        """
+        Approximate top-k for raw chunk embeddings. Probes the nprobe closest
+        clusters, widening as needed so every query gets k candidates.
+        Each probed list is scored with one matrix product over all the
+        queries that probe it, and only its own top-k rows are kept as
+        candidates for the final ranking.
+        """
+        nprobe = nprobe or DEFAULT_NPROBE
+        queries = l2_normalize(embeddings)
+        clustered = self._clustered(prototype_matrix)
+        k = min(k, len(prototype_matrix))
+        sizes = np.diff(self.offsets)
+
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        for start in range(0, len(queries), SEARCH_BLOCK):
+            block = queries[start:start + SEARCH_BLOCK]
+            probe_order = np.argsort(-(block @ self.centroids.T), axis=1)
+            n_lists = np.maximum(nprobe, (np.cumsum(sizes[probe_order], axis=1) < k).sum(axis=1) + 1)
+            rank = np.argsort(probe_order, axis=1)
+            probed = rank < n_lists[:, None]
+
+            # k slots per probed list, filled in probe order; short lists leave -inf padding
+            slots = np.arange(k)
+            candidates = np.zeros((len(block), n_lists.max() * k), dtype=np.int64)
+            candidate_scores = np.full(candidates.shape, -np.inf, dtype=np.float32)
+            for c in range(self.nlist):
+                rows = np.flatnonzero(probed[:, c])
+                if not len(rows):
+                    continue
+                a, b = self.offsets[c], self.offsets[c + 1]
+                list_scores = block[rows] @ clustered[a:b].T
+                if b - a > k:
+                    top = np.argpartition(-list_scores, k - 1, axis=1)[:, :k]
+                else:
+                    top = np.broadcast_to(np.arange(b - a), (len(rows), b - a))
+                columns = rank[rows, c][:, None] * k + slots[:top.shape[1]]
+                candidates[rows[:, None], columns] = self.order[a + top]
+                candidate_scores[rows[:, None], columns] = np.take_along_axis(list_scores, top, axis=1)
+
+            best = np.argpartition(-candidate_scores, k - 1, axis=1)[:, :k]
+            candidates = np.take_along_axis(candidates, best, axis=1)
+            candidate_scores = np.take_along_axis(candidate_scores, best, axis=1)
+            # Best first; ties in table order like the exact scorer
+            ranked = np.lexsort((candidates, -candidate_scores), axis=1)
+            indices[start:start + len(block)] = np.take_along_axis(candidates, ranked, axis=1)
+            scores[start:start + len(block)] = np.take_along_axis(candidate_scores, ranked, axis=1)
+        return indices, scores
+
+
+def load_index(store, path=None):
+    """Load the persisted index for a store, refusing one built from a different DB snapshot."""
+    path = Path(path or index_path(store.db_path))
+    if not path.exists():
+        raise ValueError(f"No ANN index at {path}; run: python3 ann_index.py build")
+    store.get()
+    index = IVFIndex.load(path)
+    if not index.matches(store):
+        raise ValueError(f"ANN index {path} is stale (subgenres.db changed); rebuild it")
+    return index
+
+
+def load_query_embeddings(path, limit):
+    chunks = []
+    for chunk in iter_chunks(path):
+        chunks.append(chunk)
+        if len(chunks) >= limit:
+            break
+    return chunks
+
+
+def recall_report(index, prototypes, queries, nprobes, k=TOP_K):
+    """Compare ANN top-k lists with exact brute force for each nprobe setting."""
+    start = time.perf_counter()
+    exact_idx, _ = score_matrix(queries, prototypes.matrix, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    rows = []
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        ann_idx, _ = index.search(queries, prototypes.matrix, k, nprobe)
+        ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        overlap = [len(set(a) & set(e)) / len(e) for a, e in zip(ann_idx.tolist(), exact_idx.tolist())]
+        rows.append({
+            'nprobe': nprobe,
+            'recall_at_k': float(np.mean(overlap)),
+            'identical_lists': float(np.mean([a == e for a, e in zip(ann_idx.tolist(), exact_idx.tolist())])),
+            'ms_per_query': ann_ms,
+            'exact_ms_per_query': exact_ms
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF index over subgenre prototypes")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--db", default=str(DB_PATH), help="Path to subgenres.db")
+    parser.add_argument("--nlist", type=int, help="Number of clusters (default ~sqrt(rows))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, DEFAULT_NPROBE, 16],
+                        help="Clusters probed per query (report)")
+    parser.add_argument("--queries", help="Chunk file to use as queries (default: noisy prototypes)")
+    parser.add_argument("--limit", type=int, default=500, help="Max queries for the report")
+    args = parser.parse_args()
+
+    store = get_store(args.db)
+    prototypes = store.get()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        index = IVFIndex.build(prototypes, args.nlist, source_mtime=store.mtime)
+        path = index_path(args.db)
+        index.save(path)
+        sizes = np.diff(index.offsets)
+        print(f"✅ Built {index.nlist} lists over {len(prototypes)} prototypes in {time.perf_counter() - start:.2f}s")
+        print(f"   List sizes: min {sizes.min()}, median {int(np.median(sizes))}, max {sizes.max()}")
+        print(f"📁 {path}")
+        return
+
+    index = load_index(store)
+    if args.queries:
+        chunks = load_query_embeddings(args.queries, args.limit)
+        queries = stack_embeddings(chunks, prototypes.matrix.shape[1])
+    else:
+        rng = np.random.default_rng(0)
+        rows = rng.choice(len(prototypes), min(args.limit, len(prototypes)), replace=False)
+        queries = prototypes.matrix[rows] + rng.normal(0, 0.05, (len(rows), prototypes.matrix.shape[1])).astype(np.float32)
+
+    print(f"📊 Recall vs exact top-{TOP_K} ({len(queries)} queries, {index.nlist} lists)")
+    for row in recall_report(index, prototypes, queries, args.nprobe):
+        print(f"   nprobe={row['nprobe']:<4d} recall@{TOP_K}={row['recall_at_k']:.3f}  "
+              f"identical={row['identical_lists']:.1%}  "
+              f"{row['ms_per_query']:.3f} ms/query (exact {row['exact_ms_per_query']:.3f})")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(json.dumps({'error': str(e)}), file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Reproducible benchmark of the scoring hot path on synthetic data.
+For every combination of prototype count, chunk count and dimensions it
+generates a seeded prototype table and chunk set and times each entry point:
+
+    score_matrix      top-k matrix product (similarity_engine.score_matrix)
+    per_chunk         per-chunk top-20 records (calculate_similarity_for_chunks)
+    aggregate         micro-batch scoring + GenreAggregator, as in
+                      similarity_with_aggregation.py
+    int8              int8 first pass + float32 re-rank of the best
+                      DEFAULT_RERANK rows (quantized_matrix.py)
+
+Each data set runs in a fresh process, so peak RSS is not inflated by the
+previous case. Wall time is the median of at least --repeat runs after one
+warm-up; fast cases are repeated until they add up to MIN_SECONDS.
+A checksum of the ranked genres catches changes in output. Every case also
+records the size of the matrix it scores against; int8 cases record how
+many chunks' top-20 ordering differs from score_matrix, and are summarized
+against score_matrix (speed, matrix size) after the grid.
+
+Results can be saved as a baseline and later runs compared against it;
+the exit status is 1 when a case is slower, uses more memory or produces
+different rankings than the baseline.
+
+Usage:
+    python3 benchmark_scoring.py --save-baseline
+    python3 benchmark_scoring.py                      # compare with the baseline
+    python3 benchmark_scoring.py --prototypes 485 --chunks 200 --dims 1024 --repeat 5
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+from chunk_reader import BATCH_SIZE, iter_batches
+from genre_aggregator import GenreAggregator
+from quantized_matrix import DEFAULT_RERANK, QuantizedMatrix
+from similarity_engine import TOP_K, Prototypes, calculate_similarity_for_chunks, score_matrix, stack_embeddings
+from subgenres_db import DATA_DIR
+
+PROTOTYPE_COUNTS = [485, 5000, 50000]
+CHUNK_COUNTS = [10, 200, 2000]
+DIMS = [768, 1024]
+ENTRY_POINTS = ['score_matrix', 'per_chunk', 'aggregate', 'int8']
+BASELINE_PATH = DATA_DIR / "benchmark_baseline.json"
+
+# Parents in the synthetic taxonomy
+N_PARENTS = 20
+# Peak RSS growth below this is noise, whatever the tolerance
+RSS_SLACK_MB = 16
+# Timed runs per case continue until they add up to this
+MIN_SECONDS = 0.2
+MAX_RUNS = 1000
+
+
+def make_prototypes(n, dims, seed=0):
+    """Seeded taxonomy: N_PARENTS parent centroids with subgenres scattered around them."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((N_PARENTS, dims), dtype=np.float32)
+    parents = np.arange(n) % N_PARENTS
+    matrix = centers[parents] + rng.standard_normal((n, dims), dtype=np.float32)
+    return Prototypes(
+        list(range(1, n + 1)),
+        [f"Parent {p}" for p in parents],
+        [f"Subgenre {i}" for i in range(n)],
+        [f"Prototype text for subgenre {i}" for i in range(n)],
+        matrix
+    )
+
+
+def make_chunks(n, prototypes, seed=1):
+    """Seeded chunks near random prototypes, with list embeddings as read from n8n JSON."""
+    rng = np.random.default_rng(seed)
+    dims = prototypes.matrix.shape[1]
+    rows = rng.integers(0, len(prototypes), n)
+    embeddings = prototypes.matrix[rows] + 0.05 * rng.standard_normal((n, dims), dtype=np.float32)
+    return [
+        {
+            'book_title': 'Benchmark Book',
+            'chunk_number': i + 1,
+            'chunk_text': f"Synthetic chunk {i + 1} " * 20,
+            'embedding': embeddings[i].tolist()
+        }
+        for i in range(n)
+    ]
+
+
+def run_score_matrix(chunks, prototypes):
+    indices, _ = score_matrix(stack_embeddings(chunks, prototypes.matrix.shape[1]), prototypes.matrix, TOP_K)
+    return indices.tolist()
+
+
+def run_per_chunk(chunks, prototypes):
+    results = calculate_similarity_for_chunks(chunks, prototypes)
+    return [[g['subgenre'] for g in r['top_genres']] for r in results]
+
+
+def run_aggregate(chunks, prototypes):
+    aggregator = GenreAggregator(len(prototypes))
+    for batch in iter_batches(iter(chunks), BATCH_SIZE):
+        aggregator.add_batch(batch, prototypes)
+    result = aggregator.result(prototypes)
+    return [(g['subgenre'], g['votes']) for g in result['top_20_genres']]
+
+
+@functools.lru_cache(maxsize=1)
+def quantized_for(prototypes):
+    """Int8 copy of a data set's matrix; built once, as the import does, outside the timed runs."""
+    return QuantizedMatrix.build(prototypes.matrix)
+
+
+def run_int8(chunks, prototypes):
+    embeddings = stack_embeddings(chunks, prototypes.matrix.shape[1])
+    indices, _ = quantized_for(prototypes).search(embeddings, prototypes.matrix, TOP_K, DEFAULT_RERANK)
+    return indices.tolist()
+
+
+RUNNERS = {
+    'score_matrix': run_score_matrix,
+    'per_chunk': run_per_chunk,
+    'aggregate': run_aggregate,
+    'int8': run_int8
+}
+
+
+def _reset_peak_rss():
+    """Reset the kernel's RSS high-water mark (Linux); False if unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    """Peak RSS in MB: VmHWM on Linux, else ru_maxrss for the whole process."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def case_key(entry, n_prototypes, n_chunks, dims):
+    return f"{entry}/{n_prototypes}x{dims}/{n_chunks}"
+
+
+def run_data_set(n_prototypes, n_chunks, dims, entries, repeat):
+    """Time the entry points on one synthetic data set (runs in a worker process)."""
+    prototypes = make_prototypes(n_prototypes, dims)
+    chunks = make_chunks(n_chunks, prototypes)
+    rows = {}
+    for entry in entries:
+        runner = RUNNERS[entry]
+        per_run_rss = _reset_peak_rss()
+        output = runner(chunks, prototypes)
+        extra = {'matrix_mb': prototypes.matrix.nbytes / 1e6}
+        if entry == 'int8':
+            exact = run_score_matrix(chunks, prototypes)
+            extra['matrix_mb'] = quantized_for(prototypes).nbytes / 1e6
+            extra['order_changed'] = sum(a != b for a, b in zip(output, exact))
+        times = []
+        while len(times) < repeat or (sum(times) < MIN_SECONDS and len(times) < MAX_RUNS):
+            start = time.perf_counter()
+            runner(chunks, prototypes)
+            times.append(time.perf_counter() - start)
+        seconds = statistics.median(times)
+        rows[case_key(entry, n_prototypes, n_chunks, dims)] = {
+            'entry': entry,
+            'prototypes': n_prototypes,
+            'chunks': n_chunks,
+            'dims': dims,
+            'seconds': seconds,
+            'best_seconds': min(times),
+            'runs': len(times),
+            'chunks_per_sec': n_chunks / seconds if seconds else 0.0,
+            'peak_rss_mb': _peak_rss_mb(),
+            'peak_rss_per_entry': per_run_rss,
+            'checksum': hashlib.sha256(json.dumps(output).encode('utf-8')).hexdigest()[:16],
+            **extra
+        }
+    return rows
+
+
+def run_benchmarks(prototype_counts, chunk_counts, dims_list, entries, repeat, progress=None):
+    """Run every data set in a fresh spawned process; returns {case key: row}."""
+    ctx = get_context('spawn')
+    rows = {}
+    for dims in dims_list:
+        for n_prototypes in prototype_counts:
+            for n_chunks in chunk_counts:
+                with ctx.Pool(1) as pool:
+                    data_set = pool.apply(run_data_set, (n_prototypes, n_chunks, dims, entries, repeat))
+                rows.update(data_set)
+                if progress:
+                    for key, row in data_set.items():
+                        progress(key, row)
+    return rows
+
+
+def machine_info():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+
+def compare(current, baseline, tolerance):
+    """
+    Per-case comparison with a baseline: (key, speed ratio, RSS ratio, problems).
+    Cases missing from the baseline are skipped.
+    """
+    rows = []
+    for key, row in current.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        problems = []
+        # Best times are far less noisy than medians on a shared machine
+        speed = base['best_seconds'] / row['best_seconds'] if row['best_seconds'] else 1.0
+        rss = row['peak_rss_mb'] / base['peak_rss_mb'] if base['peak_rss_mb'] else 1.0
+        if speed < 1 - tolerance:
+            problems.append(f"{(1 - speed):.0%} slower")
+        if rss > 1 + tolerance and row['peak_rss_mb'] - base['peak_rss_mb'] > RSS_SLACK_MB:
+            problems.append(f"peak RSS +{row['peak_rss_mb'] - base['peak_rss_mb']:.0f} MB")
+        if row['checksum'] != base['checksum']:
+            problems.append("rankings changed")
+        rows.append((key, speed, rss, problems))
+    return rows
+
+
+def int8_summary(cases):
+    """(data set, speed vs score_matrix, float32 MB, int8 MB, chunks reordered, chunks) per int8 case."""
+    rows = []
+    for key, row in cases.items():
+        exact = cases.get(key.replace('int8/', 'score_matrix/', 1))
+        if row['entry'] != 'int8' or exact is None:
+            continue
+        speed = exact['best_seconds'] / row['best_seconds'] if row['best_seconds'] else 1.0
+        rows.append((key.split('/', 1)[1], speed, exact['matrix_mb'], row['matrix_mb'],
+                     row['order_changed'], row['chunks']))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scoring and aggregation on synthetic data")
+    parser.add_argument("--prototypes", type=int, nargs="+", default=PROTOTYPE_COUNTS, help="Prototype table sizes")
+    parser.add_argument("--chunks", type=int, nargs="+", default=CHUNK_COUNTS, help="Chunks per book")
+    parser.add_argument("--dims", type=int, nargs="+", default=DIMS, help="Embedding dimensions")
+    parser.add_argument("--entry", nargs="+", choices=ENTRY_POINTS, default=ENTRY_POINTS, help="Entry points to time")
+    parser.add_argument("--repeat", type=int, default=3, help="Minimum timed runs per case (median is reported)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown / memory growth before a case counts as a regression")
+    parser.add_argument("--output", type=Path, help="Also write this run's results as JSON")
+    args = parser.parse_args()
+
+    print(f"📊 Benchmarking {', '.join(args.entry)} (top-{TOP_K}, batch size {BATCH_SIZE}, "
+          f"median of at least {args.repeat} runs)")
+    print(f"   {'case':<32} {'seconds':>9} {'chunks/s':>10} {'peak RSS':>10}")
+
+    def progress(key, row):
+        print(f"   {key:<32} {row['seconds']:>9.4f} {row['chunks_per_sec']:>10.0f} {row['peak_rss_mb']:>7.0f} MB",
+              flush=True)
+
+    cases = run_benchmarks(args.prototypes, args.chunks, args.dims, args.entry, args.repeat, progress)
+    run = {'created_at': time.time(), 'machine': machine_info(), 'repeat': args.repeat, 'cases': cases}
+    if not all(row['peak_rss_per_entry'] for row in cases.values()):
+        print("⚠️  Peak RSS is per data set on this platform, not per entry point")
+
+    summary = int8_summary(cases)
+    if summary:
+        print()
+        print(f"🗜️  Int8 + re-rank of {DEFAULT_RERANK} vs score_matrix:")
+        for data_set, speed, float_mb, int8_mb, changed, n_chunks in summary:
+            print(f"   {data_set:<24} speed x{speed:.2f}  matrix {float_mb:.1f} -> {int8_mb:.1f} MB "
+                  f"(-{float_mb - int8_mb:.1f} MB)  top-20 order changed for {changed}/{n_chunks} chunks")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"📁 {args.output}")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        baseline = {'cases': {}}
+        if args.baseline.exists():
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        # Merge, so a partial run only replaces the cases it measured
+        baseline['cases'].update(cases)
+        baseline.update(created_at=run['created_at'], machine=run['machine'], repeat=args.repeat)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"✅ Saved baseline ({len(baseline['cases'])} cases): {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"⚠️  No baseline at {args.baseline}; run with --save-baseline first")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('machine') != run['machine']:
+        print(f"⚠️  Baseline was recorded on a different setup: {baseline.get('machine')}")
+
+    rows = compare(cases, baseline['cases'], args.tolerance)
+    regressions = [r for r in rows if r[3]]
+    print()
+    print(f"📈 Against baseline ({len(rows)} cases, tolerance {args.tolerance:.0%}):")
+    for key, speed, rss, problems in rows:
+        mark = '❌' if problems else '✅'
+        print(f"   {mark} {key:<32} speed x{speed:.2f}  RSS x{rss:.2f}  {', '.join(problems)}")
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s)")
+        sys.exit(1)
+    print("✅ No regressions")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(json.dumps({'error': str(e)}), file=sys.stderr)
+        sys.exit(1)
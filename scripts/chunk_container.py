@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Binary chunk container: embedded chunks without decimal-JSON floats.
+
+Layout (little-endian):
+
+    offset 0    header, 64 bytes
+                  8s  magic b'BPCHUNKS'
+                  I   format version (1)
+                  I   chunk count
+                  I   embedding dims
+                  I   reserved (0)
+                  Q   embeddings offset (64)
+                  Q   texts offset
+                  Q   texts length
+                  Q   metadata offset
+                  Q   metadata length
+    offset 64   embeddings: count x dims float32, row per chunk
+    ...         texts: every chunk_text as UTF-8, back to back
+    ...         metadata: UTF-8 JSON
+                  {"book_title": "...",
+                   "chunks": [{"chunk_number": 1, "text": [offset, length], ...}, ...]}
+
+Each chunk keeps all of its other fields (word_count, start_word, ...) in
+its metadata entry. "text" holds the byte offset and length of its
+chunk_text within the texts section. book_title is stored once, and per
+chunk only where it differs.
+
+Readers map the file and view the embedding block in place, so no float is
+ever parsed. chunk_reader.iter_chunks detects the magic and accepts either
+format; convert_chunks.py translates between them.
+"""
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from subgenres_db import EMBEDDING_DTYPE
+
+MAGIC = b'BPCHUNKS'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIIIIQQQQQ')
+
+
+def is_container(data):
+    """True if a file path or leading bytes start with the container magic."""
+    if isinstance(data, (str, os.PathLike)):
+        with open(data, 'rb') as f:
+            data = f.read(len(MAGIC))
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def write_container(path, chunks):
+    """
+    Stream embedded chunks into a container file; returns the chunk count.
+    Embeddings are written as they arrive; texts and metadata are appended
+    at the end and the header is filled in last.
+    """
+    tmp_path = f"{path}.tmp"
+    texts = []
+    entries = []
+    title = None
+    dims = None
+    text_length = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(b'\0' * HEADER.size)
+            for chunk in chunks:
+                embedding = chunk.get('embedding')
+                if embedding is None or not len(embedding):
+                    raise ValueError(f"Chunk {chunk.get('chunk_number')}: no embedding to store")
+                vector = np.asarray(embedding, dtype=EMBEDDING_DTYPE)
+                if dims is None:
+                    dims = len(vector)
+                    title = chunk.get('book_title')
+                elif len(vector) != dims:
+                    raise ValueError(f"Vector length mismatch: {len(vector)} vs {dims}")
+                f.write(vector.tobytes())
+
+                text = chunk.get('chunk_text', '').encode('utf-8')
+                entry = {k: v for k, v in chunk.items() if k not in ('embedding', 'chunk_text')}
+                if 'book_title' in entry and entry['book_title'] == title:
+                    del entry['book_title']
+                entry['text'] = [text_length, len(text)]
+                entries.append(entry)
+                texts.append(text)
+                text_length += len(text)
+
+            texts_offset = f.tell()
+            for text in texts:
+                f.write(text)
+            meta = json.dumps({'book_title': title, 'chunks': entries},
+                              separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+            meta_offset = f.tell()
+            f.write(meta)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(entries), dims or 0, 0,
+                                HEADER.size, texts_offset, text_length, meta_offset, len(meta)))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    return len(entries)
+
+
+def read_container(buffer):
+    """
+    (metadata, embeddings, texts) over a container held in any buffer (bytes,
+    mmap). embeddings is a read-only (count, dims) float32 view, texts a
+    memoryview of the texts section.
+    """
+    if len(buffer) < HEADER.size:
+        raise ValueError("Chunk container is truncated")
+    (magic, version, count, dims, _, emb_offset, texts_offset, texts_length,
+     meta_offset, meta_length) = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("Not a chunk container")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported chunk container version {version}")
+    if meta_offset + meta_length > len(buffer):
+        raise ValueError("Chunk container is truncated")
+
+    view = memoryview(buffer)
+    meta = json.loads(bytes(view[meta_offset:meta_offset + meta_length]))
+    embeddings = np.frombuffer(buffer, dtype=EMBEDDING_DTYPE, count=count * dims, offset=emb_offset)
+    return meta, embeddings.reshape(count, dims), view[texts_offset:texts_offset + texts_length]
+
+
+def iter_container_chunks(buffer):
+    """Yield chunk dicts from a container buffer; 'embedding' is a float32 row view."""
+    meta, embeddings, texts = read_container(buffer)
+    title = meta.get('book_title')
+    for i, entry in enumerate(meta['chunks']):
+        chunk = dict(entry)
+        offset, length = chunk.pop('text')
+        if title is not None:
+            chunk.setdefault('book_title', title)
+        chunk['chunk_text'] = str(texts[offset:offset + length], 'utf-8')
+        chunk['embedding'] = embeddings[i]
+        yield chunk
+
+
+def iter_container(path):
+    """Yield chunks from a container file, mapped read-only."""
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield from iter_container_chunks(mapped)
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            # Chunks handed out still view the map; it closes when they are freed
+            pass
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Incremental readers for chunk files written by n8n.
+Accepts JSONL (one chunk per line), a JSON array of chunks, or a single
+chunk object, and yields chunks one at a time without loading the file.
+Binary chunk containers (chunk_container.py) are detected by their magic
+bytes and read from a memory map instead.
+"""
+import json
+import os
+
+from chunk_container import is_container, iter_container
+
+READ_SIZE = 1 << 20
+BATCH_SIZE = 64
+
+# Written by the workflow's "Write Chunks File" node, and by save_chunks.py / embed_chunks.py
+CHUNKS_FILES = ['/tmp/n8n_chunks.bin', '/tmp/n8n_chunks.json']
+
+_decoder = json.JSONDecoder()
+
+
+def default_chunks_file():
+    """The most recently written of CHUNKS_FILES (the .bin path when neither exists)."""
+    existing = [path for path in CHUNKS_FILES if os.path.exists(path)]
+    if not existing:
+        return CHUNKS_FILES[0]
+    return max(existing, key=os.path.getmtime)
+
+
+def _skip(buf, pos, chars):
+    while pos < len(buf) and buf[pos] in chars:
+        pos += 1
+    return pos
+
+
+def iter_json_values(f, read_size=READ_SIZE):
+    """
+    Yield top-level JSON values from a text stream.
+    A top-level array is unwrapped so its elements are yielded one by one;
+    whitespace- or newline-separated values (JSONL) are yielded in order.
+    """
+    buf = ''
+    pos = 0
+    eof = False
+    in_array = None
+
+    while True:
+        # Skip whitespace, and commas between array elements
+        pos = _skip(buf, pos, ' \t\r\n,' if in_array else ' \t\r\n')
+        if pos >= len(buf):
+            if eof:
+                break
+            buf = f.read(read_size)
+            pos = 0
+            eof = not buf
+            continue
+
+        if in_array is None:
+            in_array = buf[pos] == '['
+            if in_array:
+                pos += 1
+                continue
+        if in_array and buf[pos] == ']':
+            break
+
+        try:
+            value, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Value straddles the read boundary: pull in more text and retry
+            more = f.read(read_size)
+            eof = not more
+            buf = buf[pos:] + more
+            pos = 0
+            continue
+
+        yield value
+        pos = end
+
+
+def iter_chunks(path):
+    """Yield chunks from a JSONL, JSON-array or binary container chunk file."""
+    if is_container(path):
+        yield from iter_container(path)
+        return
+    with open(path, 'r') as f:
+        yield from iter_json_values(f)
+
+
+def iter_batches(items, size=BATCH_SIZE):
+    """Group an iterable into lists of at most `size` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Persistent store of chunk embeddings, so a book can be re-scored (new
+taxonomy, different top-k) without embedding it again.
+
+Chunks are keyed by book id (sha256 of the manuscript file, or of the chunk
+texts for books that arrive as n8n chunk files), embedding model and word
+offsets. Vectors are float32 BLOBs like subgenres.db. A book is stored once
+per model; re-storing it with a different chunk size, overlap or pooling
+replaces its chunks.
+
+Usage:
+    python3 chunk_store.py list
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+from subgenres_db import DATA_DIR, EMBEDDING_DTYPE, pack_embedding, unpack_embedding
+
+CHUNK_STORE_PATH = Path(os.getenv("CHUNK_STORE", DATA_DIR / "chunk_store.db"))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS books (
+    book_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    title TEXT,
+    chunking TEXT NOT NULL,
+    dim INTEGER,
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (book_id, model)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    book_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    start_word INTEGER NOT NULL,
+    end_word INTEGER NOT NULL,
+    chunk_number INTEGER NOT NULL,
+    word_count INTEGER,
+    chunk_text TEXT,
+    embedding BLOB NOT NULL,
+    PRIMARY KEY (book_id, model, start_word, end_word)
+);
+'''
+
+# Settings that change chunk boundaries or vectors; max_chunks only truncates
+CHUNKING_KEYS = ('chunk_size', 'overlap_percent', 'pooled_span')
+
+
+def chunk_texts_id(chunks):
+    """Book id for chunks without a source file: sha256 of their texts in order."""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk.get('chunk_text', '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ChunkStore:
+    """(book id, model, word offsets) -> chunk text and float32 embedding."""
+
+    def __init__(self, path=CHUNK_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+
+    def begin_book(self, book_id, model, title, chunking):
+        """
+        Register a book before its chunks are added. Chunks stored under a
+        different chunk size, overlap or pooling are dropped.
+        """
+        chunking = {k: chunking.get(k) for k in CHUNKING_KEYS}
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                'SELECT chunking FROM books WHERE book_id = ? AND model = ?', (book_id, model)
+            ).fetchone()
+            if row and json.loads(row[0]) != chunking:
+                self.conn.execute('DELETE FROM chunks WHERE book_id = ? AND model = ?', (book_id, model))
+            self.conn.execute(
+                'INSERT OR REPLACE INTO books (book_id, model, title, chunking, dim, chunk_count, updated_at) '
+                'VALUES (?, ?, ?, ?, (SELECT dim FROM books WHERE book_id = ? AND model = ?), '
+                '(SELECT COUNT(*) FROM chunks WHERE book_id = ? AND model = ?), ?)',
+                (book_id, model, title, json.dumps(chunking, sort_keys=True),
+                 book_id, model, book_id, model, time.time())
+            )
+
+    def add_chunks(self, book_id, model, chunks):
+        """Store embedded chunks (start_word/end_word default to the chunk number)."""
+        rows = []
+        for chunk in chunks:
+            number = chunk.get('chunk_number', 0)
+            rows.append((
+                book_id, model,
+                chunk.get('start_word', number), chunk.get('end_word', number),
+                number, chunk.get('word_count'), chunk.get('chunk_text', ''),
+                pack_embedding(chunk['embedding'])
+            ))
+        if not rows:
+            return 0
+        dim = len(rows[0][-1]) // EMBEDDING_DTYPE.itemsize
+        with self._lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO chunks '
+                '(book_id, model, start_word, end_word, chunk_number, word_count, chunk_text, embedding) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self.conn.execute(
+                'UPDATE books SET dim = ?, updated_at = ?, '
+                'chunk_count = (SELECT COUNT(*) FROM chunks WHERE book_id = ? AND model = ?) '
+                'WHERE book_id = ? AND model = ?',
+                (dim, time.time(), book_id, model, book_id, model)
+            )
+        return len(rows)
+
+    def save_book(self, book_id, model, title, chunks, chunking=None):
+        """Register a book and store all of its chunks."""
+        self.begin_book(book_id, model, title, chunking or {})
+        return self.add_chunks(book_id, model, chunks)
+
+    def books(self, model=None):
+        """Stored books as dicts, newest first."""
+        query = 'SELECT book_id, model, title, chunking, dim, chunk_count, updated_at FROM books'
+        params = ()
+        if model:
+            query += ' WHERE model = ?'
+            params = (model,)
+        with self._lock:
+            rows = self.conn.execute(query + ' ORDER BY updated_at DESC', params).fetchall()
+        return [
+            {
+                'book_id': r[0], 'model': r[1], 'title': r[2], 'chunking': json.loads(r[3]),
+                'dim': r[4], 'chunk_count': r[5], 'updated_at': r[6]
+            }
+            for r in rows
+        ]
+
+    def resolve(self, book_id, model=None):
+        """Full (book_id, model) for an id or unique id prefix, like git short hashes."""
+        query = 'SELECT book_id, model FROM books WHERE substr(book_id, 1, ?) = ?'
+        params = [len(book_id), book_id]
+        if model:
+            query += ' AND model = ?'
+            params.append(model)
+        with self._lock:
+            matches = self.conn.execute(query, params).fetchall()
+        if not matches:
+            raise ValueError(f"No stored book matches '{book_id}'")
+        if len({m[0] for m in matches}) > 1:
+            raise ValueError(f"Book id '{book_id}' is ambiguous ({len(matches)} books)")
+        if len(matches) > 1:
+            raise ValueError(f"Book '{book_id}' is stored for several models; pass --model")
+        return matches[0]
+
+    def iter_chunks(self, book_id, model=None):
+        """Yield a stored book's chunks in reading order, embeddings as float32 views."""
+        book_id, model = self.resolve(book_id, model)
+        with self._lock:
+            title = self.conn.execute(
+                'SELECT title FROM books WHERE book_id = ? AND model = ?', (book_id, model)
+            ).fetchone()[0]
+            rows = self.conn.execute(
+                'SELECT chunk_number, start_word, end_word, word_count, chunk_text, embedding FROM chunks '
+                'WHERE book_id = ? AND model = ? ORDER BY start_word, end_word',
+                (book_id, model)
+            ).fetchall()
+        for number, start, end, words, text, blob in rows:
+            yield {
+                'book_title': title or 'Unknown',
+                'chunk_number': number,
+                'chunk_text': text,
+                'word_count': words,
+                'start_word': start,
+                'end_word': end,
+                'embedding': unpack_embedding(blob)
+            }
+
+    def iter_catalog(self, dim, model=None, fetch_size=1024):
+        """
+        Yield (book_id, model, title, chunk_number, preview, embedding BLOB) for
+        every stored chunk of dimension dim, book by book in reading order.
+        Only the first 150 characters of each chunk text are read.
+        """
+        query = (
+            'SELECT c.book_id, c.model, b.title, c.chunk_number, substr(c.chunk_text, 1, 150), c.embedding '
+            'FROM chunks c JOIN books b ON b.book_id = c.book_id AND b.model = c.model WHERE b.dim = ?'
+        )
+        params = [dim]
+        if model:
+            query += ' AND c.model = ?'
+            params.append(model)
+        query += ' ORDER BY c.book_id, c.model, c.start_word, c.end_word'
+
+        # Own connection, so a long catalog walk doesn't hold the shared one
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+    def close(self):
+        self.conn.close()
+
+
+_store = None
+
+
+def get_chunk_store():
+    """Process-wide chunk store, opened on first use."""
+    global _store
+    if _store is None:
+        _store = ChunkStore()
+    return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stored chunk embeddings")
+    parser.add_argument("command", choices=["list"])
+    parser.add_argument("--model", help="Only books embedded with this model")
+    args = parser.parse_args()
+
+    for book in get_chunk_store().books(args.model):
+        print(f"{book['book_id'][:12]}  {book['chunk_count']:>5} chunks  {book['dim'] or 0:>5}d  "
+              f"{book['model']:<24} {book['title']}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(json.dumps({'error': str(e)}), file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Overlapping word-window chunker, the Python counterpart of the "Chunk Text"
+node in Master-Book-Processor-JSON.json (see CHUNKING_CONFIG.md).
+
+Words are read lazily from a string or a text stream, and only the current
+window plus a short look-ahead is kept in memory, so chunks come out one at
+a time however long the manuscript is.
+"""
+from collections import deque
+from itertools import islice
+import math
+import re
+
+# Same defaults as the n8n node
+CHUNK_SIZE = 1000        # Words per chunk
+OVERLAP_PERCENT = 0.20   # 20% overlap (0.0 - 1.0)
+USE_FULL_BOOK = False    # True = process entire book, False = limit chunks
+MAX_CHUNKS = 10          # Only used if USE_FULL_BOOK is False
+
+READ_SIZE = 1 << 16
+
+_word = re.compile(r'\S+')
+
+
+def iter_words(source, read_size=READ_SIZE):
+    """Yield whitespace-separated words from a string or a text stream."""
+    if isinstance(source, str):
+        for match in _word.finditer(source):
+            yield match.group()
+        return
+
+    carry = ''
+    while True:
+        block = source.read(read_size)
+        if not block:
+            break
+        words = (carry + block).split()
+        # The last word may continue in the next block
+        carry = words.pop() if words and not block[-1].isspace() else ''
+        yield from words
+    if carry:
+        yield carry
+
+
+def iter_text_chunks(source, book_title='Unknown', chunk_size=CHUNK_SIZE,
+                     overlap_percent=OVERLAP_PERCENT, max_chunks=None):
+    """
+    Yield chunk dicts in the shape the n8n node produces (book_title,
+    chunk_number, chunk_text, word_count, start_word, end_word,
+    overlap_with_previous). A trailing window shorter than half a chunk is
+    dropped, as in the node. max_chunks=None processes the whole book.
+    """
+    overlap_words = math.floor(chunk_size * overlap_percent)
+    step = chunk_size - overlap_words
+    if chunk_size < 1 or step < 1:
+        raise ValueError(f"Invalid chunking: chunk_size={chunk_size}, overlap_percent={overlap_percent}")
+
+    words = iter_words(source)
+    # Words from the current position onward
+    window = deque()
+
+    def fill(n):
+        window.extend(islice(words, max(0, n - len(window))))
+
+    position = 0
+    chunk_count = 0
+    fill(chunk_size)
+    while window:
+        if max_chunks is not None and chunk_count >= max_chunks:
+            break
+
+        word_count = min(chunk_size, len(window))
+        yield {
+            'book_title': book_title,
+            'chunk_number': chunk_count + 1,
+            'chunk_text': ' '.join(islice(window, word_count)),
+            'word_count': word_count,
+            'start_word': position,
+            'end_word': position + word_count,
+            'overlap_with_previous': overlap_words if position > 0 else 0
+        }
+        chunk_count += 1
+
+        # Look far enough ahead to know whether at least half a chunk remains
+        fill(step + math.ceil(chunk_size / 2))
+        if len(window) - step < chunk_size / 2:
+            break
+        for _ in range(step):
+            window.popleft()
+        position += step
+        fill(chunk_size)
+
+
+def chunk_text(text, book_title='Unknown', chunk_size=CHUNK_SIZE, overlap_percent=OVERLAP_PERCENT,
+               use_full_book=USE_FULL_BOOK, max_chunks=MAX_CHUNKS):
+    """All chunks of a manuscript as a list, with the node's USE_FULL_BOOK/MAX_CHUNKS switch."""
+    return list(iter_text_chunks(
+        text, book_title, chunk_size, overlap_percent,
+        None if use_full_book else max_chunks
+    ))
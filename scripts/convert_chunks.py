@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Convert chunk files between JSON (array or JSONL) and the binary chunk
+container (chunk_container.py). The input format is detected automatically.
+
+Usage:
+    python3 convert_chunks.py /tmp/n8n_chunks.json /tmp/n8n_chunks.bin
+    python3 convert_chunks.py /tmp/n8n_chunks.bin /tmp/n8n_chunks.json --to json
+    python3 convert_chunks.py /tmp/n8n_chunks.bin --info
+"""
+import argparse
+import json
+import os
+import sys
+
+from chunk_container import HEADER, is_container, read_container, write_container
+from chunk_reader import iter_chunks
+
+
+def write_json(path, chunks):
+    """Stream chunks into a JSON array file; returns the chunk count."""
+    total = 0
+    with open(path, 'w') as out:
+        out.write('[')
+        for chunk in chunks:
+            chunk = dict(chunk, embedding=[float(x) for x in chunk['embedding']])
+            if total:
+                out.write(',')
+            out.write(json.dumps(chunk, separators=(',', ':')))
+            total += 1
+        out.write(']')
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert chunk files between JSON and the binary container")
+    parser.add_argument("input", help="Chunk file (JSON array, JSONL or binary container)")
+    parser.add_argument("output", nargs="?", help="Output file")
+    parser.add_argument("--to", choices=["binary", "json"], default="binary", help="Output format")
+    parser.add_argument("--info", action="store_true", help="Describe the input instead of converting")
+    args = parser.parse_args()
+
+    if args.info:
+        if not is_container(args.input):
+            print(f"📄 {args.input}: JSON chunk file, {os.path.getsize(args.input) / 1e6:.1f} MB")
+            return
+        with open(args.input, 'rb') as f:
+            meta, embeddings, texts = read_container(f.read())
+        print(f"📦 {args.input}: chunk container, {len(embeddings)} chunks x {embeddings.shape[1]} dims, "
+              f"'{meta.get('book_title')}'")
+        print(f"   embeddings {embeddings.nbytes / 1e6:.1f} MB, texts {len(texts) / 1e6:.1f} MB, "
+              f"metadata {(os.path.getsize(args.input) - HEADER.size - embeddings.nbytes - len(texts)) / 1e3:.1f} kB")
+        return
+
+    if not args.output:
+        parser.error("an output file is required unless --info is given")
+    if args.to == "binary":
+        count = write_container(args.output, iter_chunks(args.input))
+    else:
+        count = write_json(args.output, iter_chunks(args.input))
+
+    size_in, size_out = os.path.getsize(args.input), os.path.getsize(args.output)
+    print(f"✅ Wrote {count} chunks to {args.output} ({args.to})")
+    print(f"📦 {size_in / 1e6:.1f} MB → {size_out / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(json.dumps({'error': str(e)}), file=sys.stderr)
+        sys.exit(1)
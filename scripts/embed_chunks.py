@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Embed book chunks through the embedding cache.
+Reads chunks (JSON array or JSONL), fills in missing 'embedding' fields and
+writes a JSON array the scoring scripts can read. Chunks whose text was
+embedded before (same model, same exact text) are not sent to Ollama again.
+
+Usage:
+    python3 embed_chunks.py --input chunks.jsonl --output /tmp/n8n_chunks.json
+"""
+import argparse
+import json
+import sys
+
+from chunk_reader import BATCH_SIZE, iter_batches, iter_chunks
+from embedding_cache import get_cache
+from ollama_embeddings import EMBEDDING_MODEL, get_embeddings, latency_report
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed chunk texts (cached)")
+    parser.add_argument("--input", required=True, help="Chunks file (JSON array, JSONL or binary container)")
+    parser.add_argument("--output", default="/tmp/n8n_chunks.json", help="Output JSON array")
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="Ollama embedding model")
+    args = parser.parse_args()
+    
+    try:
+        total = 0
+        with open(args.output, 'w') as out:
+            out.write('[')
+            for batch in iter_batches(iter_chunks(args.input), BATCH_SIZE):
+                missing = [c for c in batch if c.get('embedding') is None or not len(c['embedding'])]
+                vectors = get_embeddings([c.get('chunk_text', '') for c in missing], args.model)
+                for chunk, vector in zip(missing, vectors):
+                    if vector is None:
+                        raise ValueError(f"Chunk {chunk.get('chunk_number')}: embedding failed")
+                    chunk['embedding'] = vector
+                
+                for chunk in batch:
+                    if total:
+                        out.write(',')
+                    if not isinstance(chunk['embedding'], list):
+                        chunk['embedding'] = chunk['embedding'].tolist()
+                    out.write(json.dumps(chunk, separators=(',', ':')))
+                    total += 1
+            out.write(']')
+        
+        cache = get_cache()
+        print(f"Embedded {total} chunks ({cache.hits} from cache, {cache.misses} new)", file=sys.stderr)
+        print(f"Ollama latency: {json.dumps(latency_report())}", file=sys.stderr)
+        print(args.output)
+        sys.exit(0)
+        
+    except Exception as e:
+        print(json.dumps({'error': str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Persistent content-addressed cache for embedding vectors.
+Vectors are keyed by (model name, sha256 of the exact input text) and stored
+as float32 BLOBs in a small SQLite file. When the cache grows past its size
+limit, the least recently used entries are evicted.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+
+from subgenres_db import DATA_DIR, pack_embedding, unpack_embedding
+
+CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE", DATA_DIR / "embedding_cache.db"))
+MAX_CACHE_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    dim INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (model, text_hash)
+);
+CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access);
+'''
+
+
+def text_hash(text):
+    """sha256 of the exact text sent to the model."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """(model, text) -> float32 vector cache with size-based LRU eviction."""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_CACHE_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+
+    def get_many(self, model, texts):
+        """Cached vectors for each text (None where missing); touches the hits."""
+        hashes = [text_hash(t) for t in texts]
+        found = {}
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(hashes), 500):
+            part = hashes[start:start + 500]
+            rows = self.conn.execute(
+                f'SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({",".join("?" * len(part))})',
+                [model, *part]
+            )
+            found.update((h, unpack_embedding(v)) for h, v in rows)
+
+        if found:
+            now = time.time()
+            with self.conn:
+                self.conn.executemany(
+                    'UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?',
+                    [(now, model, h) for h in found]
+                )
+        self.hits += sum(1 for h in hashes if h in found)
+        self.misses += sum(1 for h in hashes if h not in found)
+        return [found.get(h) for h in hashes]
+
+    def get(self, model, text):
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model, texts, vectors):
+        """Store vectors for texts, then evict least recently used entries if over the limit."""
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append((model, text_hash(text), len(vector), pack_embedding(vector), now))
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector, last_access) VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+        self.evict()
+
+    def put(self, model, text, vector):
+        self.put_many(model, [text], [vector])
+
+    def size_bytes(self):
+        return self.conn.execute('SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings').fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used vectors until the cache fits in max_bytes."""
+        excess = self.size_bytes() - self.max_bytes
+        if excess <= 0:
+            return 0
+        evicted = 0
+        with self.conn:
+            rows = self.conn.execute('SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_access')
+            doomed = []
+            for rowid, size in rows:
+                if excess <= 0:
+                    break
+                doomed.append((rowid,))
+                excess -= size
+            self.conn.executemany('DELETE FROM embeddings WHERE rowid = ?', doomed)
+            evicted = len(doomed)
+        return evicted
+
+    def close(self):
+        self.conn.close()
+
+
+_cache = None
+
+
+def get_cache():
+    """Process-wide cache instance, opened on first use."""
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache()
+    return _cache
@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+"""
+Name of the Ollama embedding model used for subgenre prototypes and chunks.
+Kept free of third-party imports so lightweight processes (the upload
+server) can read it without loading the embedding client.
+"""
+#EMBEDDING_MODEL = "nomic-embed-text"
+#EMBEDDING_MODEL = "mxbai-embed-large"
+EMBEDDING_MODEL = "snowflake-arctic-embed"
@@ -5,32 +5,15 @@ Updates the subgenres.json file with embedding vectors.
 """
 
 import json
-import requests
 import sys
 from pathlib import Path
 
+from embedding_cache import get_cache
+from ollama_embeddings import EMBEDDING_MODEL, get_embeddings, latency_report
+
 # Paths
 DATA_DIR = Path(__file__).parent.parent / "data"
 SUBGENRES_FILE = DATA_DIR / "subgenres.json"
-OLLAMA_URL = "http://127.0.0.1:11434/api/embeddings"
-#EMBEDDING_MODEL = "nomic-embed-text"
-#EMBEDDING_MODEL = "mxbai-embed-large"
-EMBEDDING_MODEL = "snowflake-arctic-embed"
-
-def get_embedding(text):
-    """Get embedding vector from Ollama."""
-    payload = {
-        "model": EMBEDDING_MODEL,
-        "prompt": text
-    }
-    
-    try:
-        response = requests.post(OLLAMA_URL, json=payload)
-        response.raise_for_status()
-        return response.json()["embedding"]
-    except Exception as e:
-        print(f"Error getting embedding: {e}")
-        return None
 
 def main():
     # Load subgenres
@@ -41,26 +24,31 @@ def main():
     print(f"Found {len(subgenres)} subgenres")
     
     # Clear existing embeddings to force regeneration
+    # (texts already embedded with this model come back from the embedding cache)
     print(f"Clearing existing embeddings to regenerate with {EMBEDDING_MODEL}...")
     for genre in subgenres:
         genre["embedding"] = None
     
-    # Generate embeddings
-    for i, genre in enumerate(subgenres, 1):
-        
-        print(f"[{i}/{len(subgenres)}] Generating embedding for '{genre['sub_genre']}'...")
+    # Generate embeddings (combine parent genre, subgenre, and prototype)
+    texts = [f"{genre['parent_genre']} - {genre['sub_genre']}: {genre['prototype_text']}" for genre in subgenres]
+    print(f"Generating {len(texts)} embeddings...")
+    embeddings = get_embeddings(texts)
+    
+    for i, (genre, embedding) in enumerate(zip(subgenres, embeddings), 1):
         
-        # Create text for embedding (combine parent genre, subgenre, and prototype)
-        text = f"{genre['parent_genre']} - {genre['sub_genre']}: {genre['prototype_text']}"
+        print(f"[{i}/{len(subgenres)}] '{genre['sub_genre']}'", end=" ")
         
-        embedding = get_embedding(text)
         if embedding:
             genre["embedding"] = embedding
-            print(f"  ✓ Generated embedding with {len(embedding)} dimensions")
+            print(f"✓ {len(embedding)} dimensions")
         else:
-            print(f"  ✗ Failed to generate embedding")
+            print(f"✗ Failed to generate embedding")
             sys.exit(1)
     
+    cache = get_cache()
+    print(f"\nEmbedding cache: {cache.hits} reused, {cache.misses} generated")
+    print(f"Ollama requests: {latency_report()}")
+    
     # Save updated subgenres
     print(f"\nSaving embeddings to {SUBGENRES_FILE}...")
     with open(SUBGENRES_FILE, 'w') as f:
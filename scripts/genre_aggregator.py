@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Compact vote/score aggregation over subgenre row indices.
+Keeps integer-indexed counters and running sum, mean, max and variance
+arrays; subgenre names and prototype text are attached only in result().
+Partial aggregates from different batches or workers merge exactly.
+"""
+import numpy as np
+
+from similarity_engine import TOP_K, score_chunks
+
+# Genres listed per chunk in chunk_details
+CHUNK_DETAIL_GENRES = 5
+
+
+class GenreAggregator:
+    """Running per-subgenre statistics over the top-k genres of each chunk."""
+
+    def __init__(self, n_genres, k=TOP_K, index=None, nprobe=None):
+        self.n_genres = n_genres
+        self.k = k
+        # Optional ANN index (ann_index.py) or int8 matrix (quantized_matrix.py); exact brute force when None
+        self.index = index
+        self.nprobe = nprobe
+        self.book_title = None
+        self.total_chunks = 0
+        self.votes = np.zeros(n_genres, dtype=np.int64)
+        self.score_sum = np.zeros(n_genres, dtype=np.float64)
+        self.score_max = np.full(n_genres, -np.inf, dtype=np.float64)
+        self.mean = np.zeros(n_genres, dtype=np.float64)
+        self.m2 = np.zeros(n_genres, dtype=np.float64)
+        # (chunk_number, preview, top-5 row indices, top-5 scores)
+        self.chunk_details = []
+
+    def add_batch(self, chunks, prototypes):
+        """Score a batch of chunks and fold their top-k genres into the totals."""
+        if not chunks:
+            return
+        indices, scores = score_chunks(chunks, prototypes, self.k, self.index, self.nprobe)
+        self.add_scores(chunks, indices, scores)
+
+    def add_scores(self, chunks, indices, scores):
+        """Fold already-scored top-k rows (one per chunk) into the totals."""
+        if not chunks:
+            return
+        if self.book_title is None:
+            self.book_title = chunks[0].get('book_title', 'Unknown')
+
+        for i, chunk_data in enumerate(chunks):
+            self.chunk_details.append((
+                chunk_data.get('chunk_number', self.total_chunks + i + 1),
+                chunk_data.get('chunk_text', '')[:150],
+                indices[i, :CHUNK_DETAIL_GENRES].tolist(),
+                scores[i, :CHUNK_DETAIL_GENRES].tolist()
+            ))
+        self.total_chunks += len(chunks)
+
+        # Batch statistics per genre, then a pairwise merge into the running totals
+        flat_idx = indices.ravel()
+        flat_scores = scores.ravel().astype(np.float64)
+        votes = np.bincount(flat_idx, minlength=self.n_genres)
+        score_sum = np.bincount(flat_idx, weights=flat_scores, minlength=self.n_genres)
+        mean = np.divide(score_sum, votes, out=np.zeros(self.n_genres), where=votes > 0)
+        m2 = np.bincount(flat_idx, weights=(flat_scores - mean[flat_idx]) ** 2, minlength=self.n_genres)
+        score_max = np.full(self.n_genres, -np.inf)
+        np.maximum.at(score_max, flat_idx, flat_scores)
+
+        self._merge_stats(votes, score_sum, score_max, mean, m2)
+
+    def _merge_stats(self, votes, score_sum, score_max, mean, m2):
+        # Chan et al. parallel update of mean and sum of squared deviations
+        total = self.votes + votes
+        delta = mean - self.mean
+        weight = np.divide(votes, total, out=np.zeros(self.n_genres), where=total > 0)
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + m2 + delta ** 2 * self.votes * weight
+        self.votes = total
+        self.score_sum = self.score_sum + score_sum
+        self.score_max = np.maximum(self.score_max, score_max)
+
+    def merge(self, other):
+        """Fold another partial aggregate (e.g. from a later batch or a worker) into this one."""
+        if other.n_genres != self.n_genres:
+            raise ValueError(f"Cannot merge aggregates over {other.n_genres} and {self.n_genres} genres")
+        if self.book_title is None:
+            self.book_title = other.book_title
+        self.total_chunks += other.total_chunks
+        self.chunk_details.extend(other.chunk_details)
+        self._merge_stats(other.votes, other.score_sum, other.score_max, other.mean, other.m2)
+        return self
+
+    def result(self, prototypes, top_n=20):
+        """Compact aggregated result emitted by similarity_with_aggregation.py."""
+        voted = np.flatnonzero(self.votes)
+        avg = self.score_sum[voted] / self.votes[voted]
+        # Most votes first, then highest average similarity, then table order
+        order = voted[np.lexsort((voted, -avg, -self.votes[voted]))][:top_n]
+
+        top_genres = [
+            {
+                'subgenre': prototypes.sub_genres[i],
+                'parent': prototypes.parent_genres[i],
+                'prototype_text': prototypes.prototype_texts[i],
+                'votes': int(self.votes[i]),
+                'avg_similarity': float(self.score_sum[i] / self.votes[i]),
+                'max_similarity': float(self.score_max[i]),
+                'similarity_std': float(np.sqrt(self.m2[i] / self.votes[i]))
+            }
+            for i in order.tolist()
+        ]
+
+        chunk_details = [
+            {
+                'chunk_number': chunk_num,
+                'chunk_preview': preview,
+                'top_5_genres': [
+                    {
+                        'subgenre': prototypes.sub_genres[i],
+                        'parent': prototypes.parent_genres[i],
+                        'similarity': s
+                    } for i, s in zip(idx, sims)
+                ]
+            }
+            for chunk_num, preview, idx, sims in sorted(self.chunk_details, key=lambda d: d[0])
+        ]
+
+        return {
+            'book_title': self.book_title or 'Unknown',
+            'total_chunks': self.total_chunks,
+            'top_20_genres': top_genres,
+            'chunk_details': chunk_details,
+            'processing_complete': True
+        }
+
+
+def aggregate_chunks(chunks, prototypes, k=TOP_K, index=None, nprobe=None):
+    """
+    Score a book's chunks and aggregate top-k votes per subgenre.
+    Returns the compact result emitted by similarity_with_aggregation.py.
+    """
+    aggregator = GenreAggregator(len(prototypes), k, index, nprobe)
+    aggregator.add_batch(chunks, prototypes)
+    return aggregator.result(prototypes)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Two-stage scoring over the genre hierarchy.
+Each parent genre gets a centroid (the normalized mean of its subgenre
+prototypes). A chunk is scored against the centroids first. Only the
+subgenres under its top FANOUT parents are then scored in full. Unlike
+ann_index.py's k-means lists, the lists here are the taxonomy's own parent
+genres, so nothing needs to be built or persisted. The work per chunk is
+roughly parents + FANOUT x subgenres per parent instead of every subgenre.
+
+The report compares pruned and exhaustive scoring on a validation set. It
+shows how often a chunk's top-20 differs, and how often a book's aggregated
+top-20 differs, for each fan-out.
+
+Usage:
+    python3 hierarchical_scoring.py report [--fanout 1 2 3 5] [--queries /tmp/n8n_chunks.json]
+    python3 hierarchical_scoring.py report --books 20
+    python3 similarity_with_aggregation.py --hierarchical 3
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from ann_index import IVFIndex
+from chunk_reader import iter_chunks
+from chunk_store import get_chunk_store
+from genre_aggregator import GenreAggregator
+from prototype_store import get_store
+from similarity_engine import TOP_K, l2_normalize, score_matrix, stack_embeddings
+from subgenres_db import DB_PATH
+
+DEFAULT_FANOUT = 3
+
+
+def parent_index(prototypes, source_mtime=None):
+    """IVFIndex with one inverted list per parent genre, centroids at the parents' mean direction."""
+    _, assignments = np.unique(np.array(prototypes.parent_genres, dtype=str), return_inverse=True)
+    n_parents = assignments.max() + 1
+    sums = np.zeros((n_parents, prototypes.matrix.shape[1]), dtype=np.float32)
+    np.add.at(sums, assignments, prototypes.matrix)
+    order = np.argsort(assignments, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_parents))])
+    return IVFIndex(l2_normalize(sums), order, offsets, len(prototypes), source_mtime)
+
+
+def scored_fraction(index, queries, fanout):
+    """Mean share of subgenre rows scored in full per query (centroid scores excluded)."""
+    probe = np.argsort(-(l2_normalize(queries) @ index.centroids.T), axis=1)[:, :fanout]
+    sizes = np.diff(index.offsets)
+    return float(sizes[probe].sum(axis=1).mean() / index.source_count)
+
+
+def chunk_divergence(index, prototypes, queries, fanouts, k=TOP_K):
+    """Per-chunk pruned vs exhaustive top-k for each fan-out."""
+    start = time.perf_counter()
+    exact_idx, _ = score_matrix(queries, prototypes.matrix, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    exact_lists = exact_idx.tolist()
+
+    rows = []
+    for fanout in fanouts:
+        start = time.perf_counter()
+        pruned_idx, _ = index.search(queries, prototypes.matrix, k, fanout)
+        pruned_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        pruned_lists = pruned_idx.tolist()
+        rows.append({
+            'fanout': fanout,
+            'top_k_differs': float(np.mean([p != e for p, e in zip(pruned_lists, exact_lists)])),
+            'top_k_set_differs': float(np.mean([set(p) != set(e) for p, e in zip(pruned_lists, exact_lists)])),
+            'recall_at_k': float(np.mean([len(set(p) & set(e)) / len(e) for p, e in zip(pruned_lists, exact_lists)])),
+            'top1_agreement': float(np.mean(pruned_idx[:, 0] == exact_idx[:, 0])),
+            'scored_fraction': scored_fraction(index, queries, fanout),
+            'ms_per_chunk': pruned_ms,
+            'exact_ms_per_chunk': exact_ms
+        })
+    return rows
+
+
+def book_divergence(index, prototypes, books, fanouts, k=TOP_K):
+    """How often each book's aggregated top-20 changes under pruning, per fan-out."""
+    def top20(chunks, nprobe=None):
+        aggregator = GenreAggregator(len(prototypes), k, index if nprobe else None, nprobe)
+        aggregator.add_batch(chunks, prototypes)
+        return [(g['parent'], g['subgenre']) for g in aggregator.result(prototypes)['top_20_genres']]
+
+    exact = [top20(chunks) for chunks in books]
+    rows = []
+    for fanout in fanouts:
+        pruned = [top20(chunks, fanout) for chunks in books]
+        rows.append({
+            'fanout': fanout,
+            'books': len(books),
+            'top20_differs': float(np.mean([p != e for p, e in zip(pruned, exact)])),
+            'top20_set_differs': float(np.mean([set(p) != set(e) for p, e in zip(pruned, exact)])),
+            'top1_same': float(np.mean([p[:1] == e[:1] for p, e in zip(pruned, exact)]))
+        })
+    return rows
+
+
+def load_books(limit, model=None):
+    """Chunks of up to `limit` stored books (chunk_store.py), newest first."""
+    store = get_chunk_store()
+    return [list(store.iter_chunks(b['book_id'], b['model'])) for b in store.books(model)[:limit]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parent-genre two-stage scoring")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--db", default=str(DB_PATH), help="Path to subgenres.db")
+    parser.add_argument("--fanout", type=int, nargs="+", default=[1, 2, DEFAULT_FANOUT, 5],
+                        help="Parent genres expanded per chunk")
+    parser.add_argument("--queries", help="Chunk file to validate on (default: noisy prototypes)")
+    parser.add_argument("--books", type=int, help="Validate on this many books from the chunk store")
+    parser.add_argument("--model", help="Embedding model of the stored books")
+    parser.add_argument("--limit", type=int, default=2000, help="Max chunks for the per-chunk report")
+    args = parser.parse_args()
+
+    store = get_store(args.db)
+    prototypes = store.get()
+    dims = prototypes.matrix.shape[1]
+    index = parent_index(prototypes, store.mtime)
+    sizes = np.diff(index.offsets)
+
+    books = []
+    if args.books:
+        books = [b for b in load_books(args.books, args.model) if b and len(b[0]['embedding']) == dims]
+        queries = stack_embeddings([c for book in books for c in book][:args.limit], dims)
+    elif args.queries:
+        book = list(iter_chunks(args.queries))
+        books = [book]
+        queries = stack_embeddings(book[:args.limit], dims)
+    else:
+        rng = np.random.default_rng(0)
+        rows = rng.choice(len(prototypes), min(args.limit, len(prototypes)), replace=False)
+        queries = prototypes.matrix[rows] + rng.normal(0, 0.05, (len(rows), dims)).astype(np.float32)
+    if not len(queries):
+        raise ValueError("No validation chunks")
+
+    print(f"🌳 {len(prototypes)} subgenres under {index.nlist} parent genres "
+          f"({sizes.min()}-{sizes.max()} per parent)")
+    print(f"📊 Pruned vs exhaustive top-{TOP_K} per chunk ({len(queries)} chunks)")
+    for row in chunk_divergence(index, prototypes, queries, args.fanout):
+        print(f"   fanout={row['fanout']:<3d} differs={row['top_k_differs']:.1%} "
+              f"(as set {row['top_k_set_differs']:.1%})  recall@{TOP_K}={row['recall_at_k']:.3f}  "
+              f"top-1={row['top1_agreement']:.1%}  scored {row['scored_fraction']:.0%} of rows  "
+              f"{row['ms_per_chunk']:.3f} ms/chunk (exact {row['exact_ms_per_chunk']:.3f})")
+
+    if books:
+        print(f"📚 Book top-20 under pruning ({len(books)} books)")
+        for row in book_divergence(index, prototypes, books, args.fanout):
+            print(f"   fanout={row['fanout']:<3d} top-20 differs for {row['top20_differs']:.1%} of books "
+                  f"(as set {row['top20_set_differs']:.1%}), top-1 same {row['top1_same']:.1%}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(json.dumps({'error': str(e)}), file=sys.stderr)
+        sys.exit(1)
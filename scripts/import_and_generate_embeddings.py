@@ -2,38 +2,39 @@
 """
 Import subgenres from Excel and generate fresh embeddings using Ollama.
 Reads from 'subgenres2.0_extendedv3' sheet.
+
+With --incremental, the sheet is diffed against the current subgenres.json:
+only added or modified subgenres are re-embedded, and the result is applied
+to both subgenres.json and subgenres.db in one transaction. Use a full
+rebuild after changing EMBEDDING_MODEL. Both modes refresh the prototype
+matrix export (prototype_matrix.py) afterwards.
+
+Usage:
+    python3 import_and_generate_embeddings.py                 # full rebuild of subgenres.json + DB
+    python3 import_and_generate_embeddings.py --incremental   # diff and update JSON + DB
 """
 
+import argparse
 import json
-import requests
+import os
+import sqlite3
 import sys
+import time
 import pandas as pd
 from pathlib import Path
 
+from embedding_cache import get_cache, text_hash
+from ollama_embeddings import EMBEDDING_MODEL, get_embeddings, latency_report
+from prototype_matrix import export_matrix, matrix_paths, quantized_paths
+from subgenres_db import DB_PATH, create_table, insert_subgenres, is_binary_schema, pack_embedding, table_columns
+
 # Paths
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR.parent / "data"
 EXCEL_FILE = SCRIPT_DIR.parent / "Master Subgenre List 2.1 16th Sept 2025.xlsx"
 SUBGENRES_FILE = DATA_DIR / "subgenres.json"
-OLLAMA_URL = "http://127.0.0.1:11434/api/embeddings"
-EMBEDDING_MODEL = "snowflake-arctic-embed"
 SHEET_NAME = "subgenres2.0_extendedv3"
 
-def get_embedding(text):
-    """Get embedding vector from Ollama."""
-    payload = {
-        "model": EMBEDDING_MODEL,
-        "prompt": text
-    }
-    
-    try:
-        response = requests.post(OLLAMA_URL, json=payload)
-        response.raise_for_status()
-        return response.json()["embedding"]
-    except Exception as e:
-        print(f"Error getting embedding: {e}")
-        return None
-
 def create_prototype_text(row):
     """Create a rich prototype text from all available columns."""
     parts = []
@@ -63,7 +64,215 @@ def create_prototype_text(row):
     
     return ". ".join(parts)
 
+def sheet_to_subgenres(df):
+    """Subgenre dicts (embedding still None) for every row of the sheet."""
+    return [
+        {
+            "parent_genre": str(row['Parent Genre']),
+            "sub_genre": str(row['Sub Genre']),
+            "prototype_text": create_prototype_text(row),
+            "embedding": None  # Will generate below
+        }
+        for row in df.to_dict('records')
+    ]
+
+def subgenre_keys(subgenres):
+    """
+    Stable key per subgenre: "Parent / Sub", with "#2", "#3"... appended
+    when the same pair appears more than once.
+    """
+    seen = {}
+    keys = []
+    for genre in subgenres:
+        key = f"{genre['parent_genre']} / {genre['sub_genre']}"
+        seen[key] = seen.get(key, 0) + 1
+        keys.append(key if seen[key] == 1 else f"{key}#{seen[key]}")
+    return keys
+
+def diff_subgenres(existing, subgenres):
+    """
+    Compare the sheet with the current subgenres by key and content hash.
+    Unchanged rows take over their existing embedding. Returns the lists of
+    added, modified, removed and unchanged keys.
+    """
+    old = dict(zip(subgenre_keys(existing), existing))
+    diff = {'added': [], 'modified': [], 'removed': [], 'unchanged': []}
+    
+    keys = subgenre_keys(subgenres)
+    for key, genre in zip(keys, subgenres):
+        previous = old.get(key)
+        if previous is None:
+            diff['added'].append(key)
+        elif (text_hash(previous.get('prototype_text') or '') != text_hash(genre['prototype_text'])
+              or not previous.get('embedding')):
+            diff['modified'].append(key)
+        else:
+            genre['embedding'] = previous['embedding']
+            diff['unchanged'].append(key)
+    
+    new_keys = set(keys)
+    diff['removed'] = [key for key in old if key not in new_keys]
+    return diff
+
+def apply_to_db(conn, subgenres, model=EMBEDDING_MODEL):
+    """
+    Bring subgenres.db in line with the new subgenre list: matching rows keep
+    their id and are updated only if their text, model or vector differs,
+    new rows are appended, and rows no longer in the sheet are deleted.
+    Returns (inserted, updated, deleted). Runs inside the caller's transaction.
+    """
+    if not table_columns(conn):
+        create_table(conn)
+    elif 'embedding_dim' not in table_columns(conn):
+        raise ValueError("subgenres.db still stores JSON embeddings; run migrate_subgenres_db.py first")
+    
+    rows = conn.execute(
+        'SELECT id, parent_genre, sub_genre, prototype_text, embedding, embedding_model FROM subgenres ORDER BY id'
+    ).fetchall()
+    existing = dict(zip(
+        subgenre_keys([{'parent_genre': r[1], 'sub_genre': r[2]} for r in rows]),
+        rows
+    ))
+    
+    updates = []
+    added = []
+    keys = subgenre_keys(subgenres)
+    for key, genre in zip(keys, subgenres):
+        row = existing.get(key)
+        if row is None:
+            added.append(genre)
+            continue
+        blob = pack_embedding(genre['embedding']) if genre['embedding'] else None
+        if (row[3], row[4], row[5]) != (genre['prototype_text'], blob, model):
+            dims = len(genre['embedding']) if blob else None
+            updates.append((genre['prototype_text'], blob, dims, model, row[0]))
+    
+    new_keys = set(keys)
+    deleted = [(row[0],) for key, row in existing.items() if key not in new_keys]
+    
+    conn.executemany('DELETE FROM subgenres WHERE id = ?', deleted)
+    conn.executemany(
+        'UPDATE subgenres SET prototype_text = ?, embedding = ?, embedding_dim = ?, embedding_model = ? WHERE id = ?',
+        updates
+    )
+    next_id = (conn.execute('SELECT MAX(id) FROM subgenres').fetchone()[0] or 0) + 1
+    for offset, genre in enumerate(added):
+        genre['id'] = next_id + offset
+    insert_subgenres(conn, added, model)
+    for genre in added:
+        del genre['id']
+    return len(added), len(updates), len(deleted)
+
+def db_needs_migration():
+    """True if subgenres.db exists but still stores JSON embeddings."""
+    if not DB_PATH.exists():
+        return False
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return bool(table_columns(conn)) and not is_binary_schema(conn)
+    finally:
+        conn.close()
+
+def write_json_and_db(subgenres):
+    """
+    Write subgenres.json and apply the same list to subgenres.db. The DB
+    transaction holds the write lock while the new JSON file is swapped in,
+    so both files change together or not at all. Returns (inserted, updated, deleted).
+    """
+    tmp_file = SUBGENRES_FILE.with_suffix('.json.tmp')
+    SUBGENRES_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(tmp_file, 'w') as f:
+        json.dump(subgenres, f, indent=2)
+    
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            counts = apply_to_db(conn, subgenres)
+            os.replace(tmp_file, SUBGENRES_FILE)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+        if tmp_file.exists():
+            tmp_file.unlink()
+    return counts
+
+def incremental_import(subgenres, timings):
+    """Re-embed only added/modified subgenres and update subgenres.json and subgenres.db together."""
+    start = time.perf_counter()
+    existing = []
+    if SUBGENRES_FILE.exists():
+        with open(SUBGENRES_FILE, 'r') as f:
+            existing = json.load(f)
+    diff = diff_subgenres(existing, subgenres)
+    timings['diff'] = time.perf_counter() - start
+    
+    print(f"🔍 Diff against {SUBGENRES_FILE.name} ({len(existing)} existing subgenres):")
+    for kind, symbol in (('added', '+'), ('modified', '~'), ('removed', '-')):
+        for key in diff[kind][:10]:
+            print(f"   {symbol} {key}")
+        if len(diff[kind]) > 10:
+            print(f"   {symbol} ... and {len(diff[kind]) - 10} more {kind}")
+    print()
+    
+    start = time.perf_counter()
+    changed = set(diff['added']) | set(diff['modified'])
+    to_embed = [g for key, g in zip(subgenre_keys(subgenres), subgenres) if key in changed]
+    if to_embed:
+        print(f"🤖 Embedding {len(to_embed)} added/modified subgenres with {EMBEDDING_MODEL}...")
+        failed = []
+        for genre, embedding in zip(to_embed, get_embeddings([g['prototype_text'] for g in to_embed])):
+            if embedding:
+                genre['embedding'] = embedding
+            else:
+                failed.append(genre['sub_genre'])
+        if failed:
+            raise ValueError(f"Failed to embed {len(failed)} subgenres (e.g. {failed[0]}); nothing was written")
+        print()
+    timings['embed'] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    inserted, updated, deleted = write_json_and_db(subgenres)
+    timings['write'] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    export_matrix(DB_PATH)
+    timings['export matrix'] = time.perf_counter() - start
+    
+    print("=" * 60)
+    print("✅ INCREMENTAL IMPORT COMPLETE")
+    print("=" * 60)
+    print()
+    print(f"📊 Diff summary:")
+    print(f"   • Added: {len(diff['added'])}")
+    print(f"   • Modified: {len(diff['modified'])}")
+    print(f"   • Removed: {len(diff['removed'])}")
+    print(f"   • Unchanged: {len(diff['unchanged'])}")
+    print(f"   • Re-embedded: {len(to_embed)} ({get_cache().hits} from embedding cache)")
+    print(f"   • subgenres.db: {inserted} inserted, {updated} updated, {deleted} deleted")
+    print()
+    print(f"⏱️  Timing:")
+    for phase, seconds in timings.items():
+        print(f"   • {phase}: {seconds:.2f}s")
+    print(f"   • total: {sum(timings.values()):.2f}s")
+    if to_embed:
+        print(f"   • Ollama latency: {latency_report()}")
+    print()
+    print(f"📁 {SUBGENRES_FILE}")
+    print(f"📁 {DB_PATH}")
+    print(f"📁 {matrix_paths(DB_PATH)[0]}")
+    print(f"📁 {quantized_paths(DB_PATH)[0]}")
+
 def main():
+    parser = argparse.ArgumentParser(description="Import subgenres from Excel and generate embeddings")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-embed added/modified subgenres and update subgenres.json and subgenres.db together")
+    incremental = parser.parse_args().incremental
+    timings = {}
+    
     print(f"📚 Import Subgenres and Generate Embeddings")
     print("=" * 60)
     print()
@@ -76,7 +285,9 @@ def main():
     # Load Excel sheet
     print(f"📖 Loading sheet '{SHEET_NAME}' from Excel...")
     try:
+        start = time.perf_counter()
         df = pd.read_excel(EXCEL_FILE, sheet_name=SHEET_NAME)
+        timings['load'] = time.perf_counter() - start
         print(f"✅ Loaded {len(df)} subgenres")
         print()
     except Exception as e:
@@ -98,23 +309,22 @@ def main():
     
     # Convert to our JSON format
     print(f"🔄 Converting to JSON format...")
-    subgenres = []
-    
-    for idx, row in df.iterrows():
-        # Create rich prototype text
-        prototype_text = create_prototype_text(row)
-        
-        subgenre = {
-            "parent_genre": str(row['Parent Genre']),
-            "sub_genre": str(row['Sub Genre']),
-            "prototype_text": prototype_text,
-            "embedding": None  # Will generate below
-        }
-        subgenres.append(subgenre)
+    start = time.perf_counter()
+    subgenres = sheet_to_subgenres(df)
+    timings['convert'] = time.perf_counter() - start
     
     print(f"✅ Converted {len(subgenres)} subgenres")
     print()
     
+    # Checked before embedding, so a legacy DB does not fail the import at the very end
+    if db_needs_migration():
+        print(f"❌ {DB_PATH} still stores JSON embeddings; run migrate_subgenres_db.py first")
+        sys.exit(1)
+    
+    if incremental:
+        incremental_import(subgenres, timings)
+        return
+    
     # Show example of first subgenre
     print("📝 Example subgenre (first entry):")
     print(f"   Parent: {subgenres[0]['parent_genre']}")
@@ -124,14 +334,15 @@ def main():
     
     # Generate embeddings
     print(f"🤖 Generating embeddings with {EMBEDDING_MODEL}...")
-    print(f"   This will take ~5-10 minutes for {len(subgenres)} subgenres")
+    print(f"   Cached texts are reused; only new or changed subgenres call Ollama")
     print()
     
+    embeddings = get_embeddings([genre['prototype_text'] for genre in subgenres])
+    
     failed = []
-    for i, genre in enumerate(subgenres, 1):
+    for i, (genre, embedding) in enumerate(zip(subgenres, embeddings), 1):
         print(f"[{i}/{len(subgenres)}] {genre['sub_genre'][:40]:40s}", end=" ", flush=True)
         
-        embedding = get_embedding(genre['prototype_text'])
         if embedding:
             genre["embedding"] = embedding
             print(f"✓ ({len(embedding)} dims)")
@@ -153,11 +364,20 @@ def main():
             print("❌ Aborted")
             sys.exit(1)
     
-    # Save to JSON
-    print(f"💾 Saving to {SUBGENRES_FILE}...")
-    SUBGENRES_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(SUBGENRES_FILE, 'w') as f:
-        json.dump(subgenres, f, indent=2)
+    # Rows without a vector cannot be scored, so the DB and matrix export are
+    # only rebuilt from a complete set of embeddings
+    if failed:
+        print(f"💾 Saving to {SUBGENRES_FILE}...")
+        SUBGENRES_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(SUBGENRES_FILE, 'w') as f:
+            json.dump(subgenres, f, indent=2)
+        print(f"⚠️  {DB_PATH.name} and the matrix export were left unchanged; re-run once every subgenre embeds")
+    else:
+        print(f"💾 Saving to {SUBGENRES_FILE} and {DB_PATH}...")
+        inserted, updated, deleted = write_json_and_db(subgenres)
+        print(f"   • subgenres.db: {inserted} inserted, {updated} updated, {deleted} deleted")
+        print("🧮 Exporting prototype matrix...")
+        export_matrix(DB_PATH)
     
     print()
     print("=" * 60)
@@ -168,10 +388,17 @@ def main():
     print(f"   • Total subgenres: {len(subgenres)}")
     print(f"   • Successfully embedded: {len(subgenres) - len(failed)}")
     print(f"   • Failed: {len(failed)}")
+    print(f"   • Reused from embedding cache: {get_cache().hits}")
+    print(f"   • Newly embedded: {get_cache().misses - len(failed)}")
+    print(f"   • Ollama latency: {latency_report()}")
     print(f"   • Model: {EMBEDDING_MODEL}")
     print(f"   • Dimensions: {len(subgenres[0]['embedding']) if subgenres[0]['embedding'] else 'N/A'}")
     print()
     print(f"📁 Output file: {SUBGENRES_FILE}")
+    if not failed:
+        print(f"📁 {DB_PATH}")
+        print(f"📁 {matrix_paths(DB_PATH)[0]}")
+        print(f"📁 {quantized_paths(DB_PATH)[0]}")
     print()
     print("🚀 Next steps:")
     print("   1. Re-import workflow in n8n (if not already done)")
@@ -179,6 +406,10 @@ def main():
     print()
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Import failed: {e}", file=sys.stderr)
+        sys.exit(1)
 
 
@@ -2,20 +2,41 @@
 """
 Output subgenres JSON in compact form (no whitespace) to reduce size.
 This helps avoid stdout maxBuffer issues in n8n.
+
+The compact copy is kept next to subgenres.json (subgenres.compact.json) and
+only rebuilt when subgenres.json changes, so a call streams bytes instead
+of parsing and re-serializing every embedding.
 """
 import json
+import os
+import shutil
 import sys
+from pathlib import Path
+
+# Not imported from subgenres_db: numpy would dominate the start-up time
+SUBGENRES_FILE = Path(__file__).parent.parent / "data" / "subgenres.json"
+COMPACT_FILE = SUBGENRES_FILE.with_name('subgenres.compact.json')
+
+
+def compact_file(source=SUBGENRES_FILE, target=COMPACT_FILE):
+    """Path of an up-to-date compact copy; the copy carries the source's mtime."""
+    mtime = os.stat(source).st_mtime_ns
+    if not target.exists() or target.stat().st_mtime_ns != mtime:
+        with open(source, 'r') as f:
+            data = json.load(f)
+        tmp = target.with_suffix('.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.utime(tmp, ns=(mtime, mtime))
+        os.replace(tmp, target)
+    return target
 
-filepath = '/Users/eerogetlost/book-processor-local/data/subgenres.json'
 
 try:
-    with open(filepath, 'r') as f:
-        data = json.load(f)
-    
-    # Output compact JSON (no whitespace)
-    print(json.dumps(data, separators=(',', ':')))
+    with open(compact_file(), 'rb') as f:
+        shutil.copyfileobj(f, sys.stdout.buffer)
+    sys.stdout.buffer.write(b'\n')
     
 except Exception as e:
-    print(f'{{"error": "{str(e)}"}}', file=sys.stderr)
+    print(json.dumps({'error': str(e)}), file=sys.stderr)
     sys.exit(1)
-
@@ -2,41 +2,104 @@
 """
 Simple script to load subgenres from SQLite and output as JSON.
 Outputs to stdout in a format n8n can handle.
+
+Only the requested columns are read, rows are streamed from the cursor,
+and embeddings can be sent as base64 float32 (4 bytes per value before
+encoding) instead of decimal lists, which keeps the output under n8n's
+stdout maxBuffer.
+
+Usage:
+    python3 load_subgenres_simple.py                                   # everything, as before
+    python3 load_subgenres_simple.py --fields id,parent_genre,sub_genre # labels only
+    python3 load_subgenres_simple.py --parent Fantasy --offset 0 --limit 50
+    python3 load_subgenres_simple.py --embedding-format base64          # 'embedding_b64' field
+
+Decoding a base64 embedding in an n8n Code node:
+    const buf = Buffer.from(item.json.embedding_b64, 'base64');
+    const embedding = Array.from(new Float32Array(buf.buffer, buf.byteOffset, buf.length / 4));
 """
+import argparse
+import base64
 import sqlite3
 import json
 import sys
 
+from subgenres_db import DB_PATH, decode_embedding, pack_embedding
+
+FIELDS = ['id', 'parent_genre', 'sub_genre', 'prototype_text', 'embedding']
+FETCH_SIZE = 64
+
+
+def parse_fields(value):
+    """Comma-separated field list, validated against FIELDS."""
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown fields: {', '.join(unknown)} (available: {', '.join(FIELDS)})")
+    return fields
+
+
+def encode_embedding(value, encoding):
+    """A stored embedding as a decimal list or a base64 float32 string."""
+    if value is None:
+        return None
+    if encoding == 'base64':
+        # Binary rows are already little-endian float32: no decode needed
+        raw = bytes(value) if isinstance(value, (bytes, memoryview)) else pack_embedding(decode_embedding(value))
+        return base64.b64encode(raw).decode('ascii')
+    return decode_embedding(value).tolist()
+
+
+def iter_subgenres(conn, fields=FIELDS, parents=None, offset=0, limit=None, encoding='list'):
+    """Yield subgenre dicts in id order, reading only the requested columns."""
+    query = f"SELECT {', '.join(fields)} FROM subgenres"
+    params = []
+    if parents:
+        query += f" WHERE parent_genre IN ({', '.join('?' * len(parents))})"
+        params.extend(parents)
+    query += ' ORDER BY id LIMIT ? OFFSET ?'
+    params.extend([-1 if limit is None else limit, offset])
+
+    cursor = conn.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        for row in rows:
+            genre = dict(zip(fields, row))
+            if 'embedding' in genre:
+                value = encode_embedding(genre.pop('embedding'), encoding)
+                genre['embedding_b64' if encoding == 'base64' else 'embedding'] = value
+            yield genre
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Export subgenres from SQLite as JSONL")
+    parser.add_argument("--fields", type=parse_fields, default=FIELDS,
+                        help=f"Comma-separated columns to output (default: {','.join(FIELDS)})")
+    parser.add_argument("--parent", action="append", help="Only this parent genre (repeatable)")
+    parser.add_argument("--offset", type=int, default=0, help="Skip this many rows (in id order)")
+    parser.add_argument("--limit", type=int, help="Output at most this many rows")
+    parser.add_argument("--embedding-format", choices=["list", "base64"], default="list",
+                        help="Decimal list, or base64 little-endian float32 in 'embedding_b64'")
+    args = parser.parse_args()
+
     try:
         # Connect to database
-        conn = sqlite3.connect('/Users/eerogetlost/book-processor-local/data/subgenres.db')
-        cursor = conn.cursor()
-        
-        # Query all subgenres
-        cursor.execute('SELECT id, parent_genre, sub_genre, prototype_text, embedding FROM subgenres')
-        rows = cursor.fetchall()
-        
+        conn = sqlite3.connect(DB_PATH)
+
         # Output each subgenre as a separate line (JSONL format)
-        # This way n8n gets 485 separate items instead of one giant JSON
-        for r in rows:
-            genre = {
-                'id': r[0],
-                'parent_genre': r[1],
-                'sub_genre': r[2],
-                'prototype_text': r[3],
-                'embedding': json.loads(r[4])
-            }
-            # Print one line per subgenre
-            print(json.dumps(genre, separators=(',', ':')))
-        
+        # This way n8n gets one item per subgenre instead of one giant JSON
+        out = sys.stdout
+        for genre in iter_subgenres(conn, args.fields, args.parent, args.offset, args.limit, args.embedding_format):
+            out.write(json.dumps(genre, separators=(',', ':')) + '\n')
+
         conn.close()
         sys.exit(0)
-        
+
     except Exception as e:
         print(json.dumps({'error': str(e)}), file=sys.stderr)
         sys.exit(1)
 
 if __name__ == '__main__':
     main()
-
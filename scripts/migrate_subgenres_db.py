@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Migrate subgenres.db from JSON-text embeddings to float32 BLOBs.
+Converts the existing database in place, or rebuilds it from subgenres.json.
+
+Usage:
+    python3 migrate_subgenres_db.py                  # convert existing DB
+    python3 migrate_subgenres_db.py --from-json      # rebuild from data/subgenres.json
+"""
+import argparse
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+from subgenres_db import (
+    DB_PATH, DEFAULT_MODEL, SUBGENRES_FILE,
+    create_table, decode_embedding, insert_subgenres, is_binary_schema
+)
+from prototype_matrix import export_matrix, matrix_paths
+
+def load_from_db(conn):
+    """Read all subgenres (legacy or binary rows) from the existing table."""
+    cursor = conn.execute('SELECT id, parent_genre, sub_genre, prototype_text, embedding FROM subgenres ORDER BY id')
+    return [
+        {
+            'id': r[0],
+            'parent_genre': r[1],
+            'sub_genre': r[2],
+            'prototype_text': r[3],
+            'embedding': decode_embedding(r[4])
+        }
+        for r in cursor
+    ]
+
+def load_from_json(path):
+    """Read subgenres from subgenres.json, numbering rows in file order."""
+    with open(path, 'r') as f:
+        subgenres = json.load(f)
+    for i, genre in enumerate(subgenres, 1):
+        genre.setdefault('id', i)
+    return subgenres
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert subgenres.db embeddings to float32 BLOBs")
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="Path to subgenres.db")
+    parser.add_argument("--from-json", nargs="?", const=SUBGENRES_FILE, type=Path,
+                        help="Rebuild the table from subgenres.json instead of the existing rows")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Embedding model recorded with each vector")
+    args = parser.parse_args()
+
+    size_before = args.db.stat().st_size if args.db.exists() else 0
+    conn = sqlite3.connect(args.db)
+
+    try:
+        if args.from_json:
+            print(f"📖 Loading subgenres from {args.from_json}...")
+            subgenres = load_from_json(args.from_json)
+        else:
+            if is_binary_schema(conn):
+                print(f"✅ {args.db} already stores float32 embeddings, nothing to do")
+                return
+            print(f"📖 Loading subgenres from {args.db}...")
+            subgenres = load_from_db(conn)
+
+        dims = {len(g['embedding']) for g in subgenres if g.get('embedding') is not None}
+        if len(dims) > 1:
+            raise ValueError(f"Mixed embedding dimensions: {sorted(dims)}")
+
+        # Swap tables inside one transaction so a failure leaves the old table intact
+        with conn:
+            conn.execute('DROP TABLE IF EXISTS subgenres_new')
+            create_table(conn, 'subgenres_new')
+            count = insert_subgenres(conn, subgenres, args.model, table='subgenres_new')
+            conn.execute('DROP TABLE IF EXISTS subgenres')
+            conn.execute('ALTER TABLE subgenres_new RENAME TO subgenres')
+
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+    size_after = args.db.stat().st_size
+    export_matrix(args.db)
+    print(f"✅ Wrote {count} subgenres ({dims.pop() if dims else 0} dims, model {args.model})")
+    print(f"📁 Memory-mapped matrix: {matrix_paths(args.db)[0]}")
+    if size_before:
+        print(f"📦 {size_before / 1e6:.1f} MB → {size_after / 1e6:.1f} MB ({size_before / size_after:.1f}x smaller)")
+    else:
+        print(f"📦 {size_after / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Migration failed: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Embedding calls to the local Ollama server, shared by the import scripts
+and the chunk-embedding path. Every lookup goes through the persistent
+embedding cache first, so unchanged texts are never re-embedded.
+
+Misses are sent by a pooled, concurrent client: texts are grouped into
+batched /api/embed requests (falling back to one /api/embeddings call per
+text on older servers), with timeouts, retries with backoff, and a
+per-request latency histogram.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from embedding_cache import get_cache
+from embedding_config import EMBEDDING_MODEL
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST_URL", "http://127.0.0.1:11434")
+OLLAMA_URL = f"{OLLAMA_HOST}/api/embeddings"
+OLLAMA_EMBED_URL = f"{OLLAMA_HOST}/api/embed"
+
+CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+BATCH_SIZE = 16
+TIMEOUT = (5, 300)
+MAX_RETRIES = 4
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Upper bounds (ms) of the latency histogram buckets
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf')]
+
+
+class LatencyHistogram:
+    """Thread-safe per-request latency histogram."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds * 1000)
+
+    def report(self):
+        with self._lock:
+            samples = np.array(self.samples)
+        if not len(samples):
+            return {'requests': 0}
+        counts = np.histogram(samples, bins=[0] + LATENCY_BUCKETS_MS)[0]
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+        return {
+            'requests': len(samples),
+            'p50_ms': round(float(p50), 1),
+            'p90_ms': round(float(p90), 1),
+            'p99_ms': round(float(p99), 1),
+            'buckets': {f"<={b:g}ms": int(c) for b, c in zip(LATENCY_BUCKETS_MS, counts) if c}
+        }
+
+
+class OllamaEmbeddingClient:
+    """Pooled, concurrent, retrying embedding client for one Ollama server."""
+
+    def __init__(self, concurrency=CONCURRENCY, batch_size=BATCH_SIZE):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.latency = LatencyHistogram()
+        # None until the first request tells us whether /api/embed exists
+        self.batch_supported = None
+
+    def _post(self, url, payload):
+        """POST with timeout and exponential backoff on connection errors and 429/5xx."""
+        for attempt in range(MAX_RETRIES + 1):
+            start = time.perf_counter()
+            try:
+                response = self.session.post(url, json=payload, timeout=TIMEOUT)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == MAX_RETRIES:
+                    raise
+            else:
+                self.latency.record(time.perf_counter() - start)
+                if response.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+                    return response
+            time.sleep(0.5 * 2 ** attempt)
+
+    def _embed_one(self, text, model):
+        response = self._post(OLLAMA_URL, {"model": model, "prompt": text})
+        response.raise_for_status()
+        return response.json()["embedding"]
+
+    def _embed_batch(self, texts, model):
+        """One batched /api/embed call, or per-text calls when the server lacks it."""
+        if self.batch_supported is not False:
+            response = self._post(OLLAMA_EMBED_URL, {"model": model, "input": texts})
+            # Older servers answer 404 "page not found"; a missing model is also a 404
+            if response.status_code == 404 and self.batch_supported is None and 'model' not in response.text:
+                self.batch_supported = False
+            else:
+                response.raise_for_status()
+                self.batch_supported = True
+                return response.json()["embeddings"]
+        return [self._embed_one(text, model) for text in texts]
+
+    def embed(self, texts, model=EMBEDDING_MODEL):
+        """
+        Embed texts concurrently; returns {text: vector or None}.
+        A failed batch is retried one text at a time so one bad input
+        doesn't fail its neighbours.
+        """
+        texts = list(dict.fromkeys(texts))
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = {}
+
+        def run(batch):
+            try:
+                return batch, self._embed_batch(batch, model)
+            except Exception as e:
+                if len(batch) == 1:
+                    print(f"Error getting embedding: {e}")
+                    return batch, [None]
+                return batch, [run([text])[1][0] for text in batch]
+
+        if self.batch_supported is None and batches:
+            # Probe the endpoint once before fanning out
+            batch, vectors = run(batches.pop(0))
+            results.update(zip(batch, vectors))
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            for batch, vectors in pool.map(run, batches):
+                results.update(zip(batch, vectors))
+        return results
+
+
+_client = None
+
+
+def get_client():
+    """Process-wide client, created on first use."""
+    global _client
+    if _client is None:
+        _client = OllamaEmbeddingClient()
+    return _client
+
+
+def fetch_embedding(text, model=EMBEDDING_MODEL):
+    """Embedding vector straight from Ollama (no cache)."""
+    return get_client().embed([text], model)[text]
+
+
+def get_embeddings(texts, model=EMBEDDING_MODEL):
+    """
+    Embedding vectors for a list of texts, as float32 lists.
+    Cache hits are returned directly; misses are fetched concurrently and
+    cached. Failed texts come back as None.
+    """
+    cache = get_cache()
+    vectors = cache.get_many(model, texts)
+
+    missing = [t for t, v in zip(texts, vectors) if v is None]
+    if missing:
+        # Same float32 precision as a cache hit
+        fetched = {
+            text: np.asarray(vector, dtype=np.float32)
+            for text, vector in get_client().embed(missing, model).items()
+            if vector is not None
+        }
+        if fetched:
+            cache.put_many(model, list(fetched), list(fetched.values()))
+        vectors = [fetched.get(t) if v is None else v for t, v in zip(texts, vectors)]
+
+    return [v.tolist() if v is not None else None for v in vectors]
+
+
+def get_embedding(text, model=EMBEDDING_MODEL):
+    """Embedding vector for one text (cached), or None on failure."""
+    return get_embeddings([text], model)[0]
+
+
+def latency_report():
+    """Latency histogram of the Ollama requests made by this process."""
+    return get_client().latency.report()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Process-pool scoring for long manuscripts.
+The normalized prototype matrix is placed in shared memory once and mapped
+by every worker instead of being pickled to each of them. Each micro-batch
+is scored into a partial GenreAggregator, and the partials are merged in
+batch order, so the result is identical to a serial run with the same
+batch size.
+"""
+from collections import deque
+from multiprocessing import get_context, shared_memory
+import os
+
+import numpy as np
+
+from genre_aggregator import GenreAggregator
+from similarity_engine import TOP_K, score_matrix, stack_embeddings
+
+# Batches in flight per worker; bounds memory while keeping every worker busy
+PREFETCH_PER_WORKER = 2
+
+_worker = {}
+
+
+def _init_worker(shm_name, shape, dtype, k):
+    """Attach to the shared prototype matrix (read-only view, no copy)."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    matrix = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    matrix.flags.writeable = False
+    _worker.update(shm=shm, matrix=matrix, k=k)
+
+
+def _score_partial(chunk_meta, embeddings):
+    """Score one micro-batch into a partial aggregate."""
+    matrix = _worker['matrix']
+    indices, scores = score_matrix(embeddings, matrix, _worker['k'])
+    partial = GenreAggregator(len(matrix), _worker['k'])
+    partial.add_scores(chunk_meta, indices, scores)
+    return partial
+
+
+def _batch_payload(batch, offset, dims):
+    """Only what a worker needs: float32 embeddings plus light chunk metadata."""
+    chunk_meta = [
+        {
+            'book_title': chunk.get('book_title', 'Unknown'),
+            'chunk_number': chunk.get('chunk_number', offset + i + 1),
+            'chunk_text': chunk.get('chunk_text', '')[:150]
+        }
+        for i, chunk in enumerate(batch)
+    ]
+    return chunk_meta, stack_embeddings(batch, dims)
+
+
+def aggregate_parallel(batches, prototypes, workers, k=TOP_K, progress=None):
+    """
+    Score an iterable of chunk batches on a process pool and merge the
+    partial aggregates in input order.
+    """
+    matrix = prototypes.matrix
+    shm = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+    try:
+        np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)[:] = matrix
+
+        # Spawned workers start clean; keep BLAS single-threaded so N workers use N cores
+        for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS'):
+            os.environ.setdefault(var, '1')
+
+        ctx = get_context('spawn')
+        aggregator = GenreAggregator(len(prototypes), k)
+        with ctx.Pool(workers, initializer=_init_worker,
+                      initargs=(shm.name, matrix.shape, matrix.dtype.str, k)) as pool:
+            pending = deque()
+            offset = 0
+            for batch in batches:
+                pending.append(pool.apply_async(_score_partial, _batch_payload(batch, offset, matrix.shape[1])))
+                offset += len(batch)
+                while len(pending) >= workers * PREFETCH_PER_WORKER:
+                    aggregator.merge(pending.popleft().get())
+                    if progress:
+                        progress(aggregator.total_chunks)
+            while pending:
+                aggregator.merge(pending.popleft().get())
+                if progress:
+                    progress(aggregator.total_chunks)
+        return aggregator
+    finally:
+        shm.close()
+        shm.unlink()
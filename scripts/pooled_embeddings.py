@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Overlap-aware chunk embeddings.
+Instead of embedding every overlapping chunk in full, the book is cut into
+non-overlapping sub-windows (spans) that tile every chunk exactly. Each span
+is embedded once, through the embedding cache, and a chunk vector is the
+word-weighted mean of its unit-length span vectors. Embedding cost is then
+one pass over the book whatever OVERLAP_PERCENT is.
+
+The default span is gcd(chunk_size, step): 200 words for 1000-word chunks
+with 20% overlap, 500 words with 50% overlap.
+
+Usage:
+    python3 pooled_embeddings.py report --input book.txt [--span 200] [--max-chunks 50]
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from chunk_reader import BATCH_SIZE, iter_batches
+from chunker import CHUNK_SIZE, OVERLAP_PERCENT, iter_text_chunks
+from embedding_cache import get_cache
+from genre_aggregator import GenreAggregator
+from ollama_embeddings import EMBEDDING_MODEL, get_embeddings
+from prototype_store import get_store
+from similarity_engine import TOP_K, l2_normalize, score_matrix, stack_embeddings
+
+
+def default_span(chunk_size=CHUNK_SIZE, overlap_percent=OVERLAP_PERCENT):
+    """Largest span that tiles every chunk: gcd of chunk size and step."""
+    step = chunk_size - math.floor(chunk_size * overlap_percent)
+    return math.gcd(chunk_size, step)
+
+
+class SubWindowEmbedder:
+    """Embeds chunks by pooling cached embeddings of fixed, non-overlapping spans."""
+
+    def __init__(self, span, chunk_size=CHUNK_SIZE, overlap_percent=OVERLAP_PERCENT, model=EMBEDDING_MODEL):
+        step = chunk_size - math.floor(chunk_size * overlap_percent)
+        if span < 1 or chunk_size % span or step % span:
+            raise ValueError(f"A {span}-word span does not tile {chunk_size}-word chunks advancing {step} words; "
+                             f"use a divisor of {default_span(chunk_size, overlap_percent)}")
+        self.span = span
+        self.model = model
+        # Span start word -> (unit vector, word count); only spans still reachable are kept
+        self._spans = {}
+        self.spans_embedded = 0
+        self.words_embedded = 0
+
+    def _chunk_spans(self, chunk):
+        """(start_word, text, word_count) of each span covering a chunk."""
+        start = chunk['start_word']
+        words = chunk['chunk_text'].split(' ')
+        return [
+            (start + i, ' '.join(words[i:i + self.span]), len(words[i:i + self.span]))
+            for i in range(0, len(words), self.span)
+        ]
+
+    def embed_batch(self, chunks):
+        """Set chunk['embedding'] for a batch of chunks in book order."""
+        if not chunks:
+            return
+        spans = {start: (text, n) for chunk in chunks for start, text, n in self._chunk_spans(chunk)}
+        # Spans before this batch can't be reused by later chunks
+        first = chunks[0]['start_word']
+        self._spans = {s: v for s, v in self._spans.items() if s >= first}
+
+        missing = [s for s in spans if s not in self._spans]
+        vectors = get_embeddings([spans[s][0] for s in missing], self.model)
+        for start, vector in zip(missing, vectors):
+            if vector is None:
+                raise ValueError(f"Embedding failed for span at word {start}")
+        if missing:
+            for start, vector in zip(missing, l2_normalize(vectors)):
+                self._spans[start] = (vector, spans[start][1])
+                self.words_embedded += spans[start][1]
+            self.spans_embedded += len(missing)
+
+        for chunk in chunks:
+            parts = [self._spans[start] for start, _, _ in self._chunk_spans(chunk)]
+            weights = np.array([n for _, n in parts], dtype=np.float32)
+            pooled = np.average(np.stack([v for v, _ in parts]), axis=0, weights=weights)
+            chunk['embedding'] = pooled.tolist()
+
+
+def embed_full(chunks, model=EMBEDDING_MODEL):
+    """Set chunk['embedding'] from one embedding per full chunk text."""
+    vectors = get_embeddings([c['chunk_text'] for c in chunks], model)
+    for chunk, vector in zip(chunks, vectors):
+        if vector is None:
+            raise ValueError(f"Chunk {chunk['chunk_number']}: embedding failed")
+        chunk['embedding'] = vector
+
+
+def comparison_report(chunks, prototypes, embedder, k=TOP_K):
+    """
+    Embed the same chunks both ways and compare vectors, per-chunk top-k
+    genre lists and the book-level top 20.
+    """
+    dims = prototypes.matrix.shape[1]
+    full = [dict(c) for c in chunks]
+    pooled = [dict(c) for c in chunks]
+    cache = get_cache()
+
+    start = time.perf_counter()
+    misses = cache.misses
+    embed_full(full, embedder.model)
+    full_seconds = time.perf_counter() - start
+    full_new = cache.misses - misses
+
+    start = time.perf_counter()
+    misses = cache.misses
+    for batch in iter_batches(pooled, BATCH_SIZE):
+        embedder.embed_batch(batch)
+    pooled_seconds = time.perf_counter() - start
+    pooled_new = cache.misses - misses
+
+    full_matrix = l2_normalize(stack_embeddings(full, dims))
+    pooled_matrix = l2_normalize(stack_embeddings(pooled, dims))
+    cosine = np.sum(full_matrix * pooled_matrix, axis=1)
+
+    full_idx, _ = score_matrix(full_matrix, prototypes.matrix, k)
+    pooled_idx, _ = score_matrix(pooled_matrix, prototypes.matrix, k)
+    overlap = [len(set(a) & set(b)) / len(a) for a, b in zip(full_idx.tolist(), pooled_idx.tolist())]
+
+    def book_top(scored):
+        aggregator = GenreAggregator(len(prototypes), k)
+        aggregator.add_batch(scored, prototypes)
+        return [(g['parent'], g['subgenre']) for g in aggregator.result(prototypes)['top_20_genres']]
+
+    full_top, pooled_top = book_top(full), book_top(pooled)
+    return {
+        'chunks': len(chunks),
+        'span_words': embedder.span,
+        'words_embedded_full': sum(c['word_count'] for c in chunks),
+        'words_embedded_pooled': embedder.words_embedded,
+        'new_embeddings_full': full_new,
+        'new_embeddings_pooled': pooled_new,
+        'seconds_full': full_seconds,
+        'seconds_pooled': pooled_seconds,
+        'mean_cosine': float(cosine.mean()),
+        'min_cosine': float(cosine.min()),
+        'top1_agreement': float(np.mean(full_idx[:, 0] == pooled_idx[:, 0])),
+        f'recall_at_{k}': float(np.mean(overlap)),
+        'book_top1_same': full_top[:1] == pooled_top[:1],
+        'book_top20_overlap': len(set(full_top) & set(pooled_top)) / max(1, len(full_top))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pooled sub-window embeddings with per-chunk embeddings")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--input", required=True, help="Sample manuscript text file")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Words per chunk")
+    parser.add_argument("--overlap", type=float, default=OVERLAP_PERCENT, help="Overlap between chunks (0.0 - 1.0)")
+    parser.add_argument("--span", type=int, help="Words per sub-window (default: gcd of chunk size and step)")
+    parser.add_argument("--max-chunks", type=int, default=50, help="Chunks sampled from the start of the book")
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="Ollama embedding model")
+    args = parser.parse_args()
+
+    span = args.span or default_span(args.chunk_size, args.overlap)
+    embedder = SubWindowEmbedder(span, args.chunk_size, args.overlap, args.model)
+    prototypes = get_store().get()
+    with open(args.input, 'r', encoding='utf-8') as f:
+        chunks = list(iter_text_chunks(f, Path(args.input).stem, args.chunk_size, args.overlap, args.max_chunks))
+    if not chunks:
+        raise ValueError("No text found in manuscript")
+
+    row = comparison_report(chunks, prototypes, embedder)
+    print(f"📊 Pooled {span}-word spans vs full chunks ({row['chunks']} chunks of {args.chunk_size} words, "
+          f"{args.overlap:.0%} overlap)")
+    print(f"   Words embedded: {row['words_embedded_pooled']} pooled vs {row['words_embedded_full']} full "
+          f"({row['seconds_pooled']:.2f}s vs {row['seconds_full']:.2f}s)")
+    print(f"   Cosine(pooled, full): mean {row['mean_cosine']:.4f}, min {row['min_cosine']:.4f}")
+    print(f"   Chunk top-1 agreement: {row['top1_agreement']:.1%}, recall@{TOP_K}: {row[f'recall_at_{TOP_K}']:.3f}")
+    print(f"   Book top-1 same: {row['book_top1_same']}, top-20 overlap: {row['book_top20_overlap']:.1%}")
+    print(json.dumps(row), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(json.dumps({'error': str(e)}), file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Text-to-aggregate pipeline for one manuscript in a single streaming process.
+Chunks the text (chunker.py), embeds each micro-batch through the embedding
+cache and Ollama client, and scores it straight into the running genre
+aggregate. Prints the same compact JSON as similarity_with_aggregation.py.
+
+Results are kept in the result store (result_store.py): running the same
+file again with the same settings, model and taxonomy prints the stored
+result. Use --force to recompute.
+
+Embedded chunks are also kept in the chunk store (chunk_store.py) under the
+file's sha256, so the book can be re-scored later without re-embedding.
+
+Usage:
+    python3 process_book.py --input book.txt --title "My Book" [--full-book]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from chunk_reader import BATCH_SIZE, iter_batches
+from chunk_store import get_chunk_store
+from chunker import CHUNK_SIZE, MAX_CHUNKS, OVERLAP_PERCENT, iter_text_chunks
+from genre_aggregator import GenreAggregator
+from ollama_embeddings import EMBEDDING_MODEL
+from pooled_embeddings import SubWindowEmbedder, default_span, embed_full
+from prototype_store import get_store
+from result_store import chunking_config, file_sha256, get_result_store, result_key
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk, embed, score and aggregate a manuscript")
+    parser.add_argument("--input", required=True, help="Manuscript text file ('-' for stdin)")
+    parser.add_argument("--title", help="Book title (default: file name)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Words per chunk")
+    parser.add_argument("--overlap", type=float, default=OVERLAP_PERCENT, help="Overlap between chunks (0.0 - 1.0)")
+    parser.add_argument("--max-chunks", type=int, default=MAX_CHUNKS, help="Chunk limit unless --full-book")
+    parser.add_argument("--full-book", action="store_true", help="Process the entire book")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Chunks embedded and scored together")
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="Ollama embedding model")
+    parser.add_argument("--pooled", type=int, nargs="?", const=0, metavar="SPAN",
+                        help="Embed non-overlapping SPAN-word sub-windows once and pool them per chunk "
+                             "(default span: gcd of chunk size and step)")
+    parser.add_argument("--force", action="store_true", help="Recompute even if a stored result exists")
+    args = parser.parse_args()
+
+    try:
+        title = args.title or ('Unknown Manuscript' if args.input == '-' else Path(args.input).stem)
+        embedder = None
+        if args.pooled is not None:
+            span = args.pooled or default_span(args.chunk_size, args.overlap)
+            embedder = SubWindowEmbedder(span, args.chunk_size, args.overlap, args.model)
+        store = get_store()
+        prototypes = store.get()
+        print(f"Loaded {len(prototypes)} genres from database", file=sys.stderr)
+        
+        # Stdin can't be hashed up front, so it is never cached
+        key = None
+        if args.input != '-':
+            sha256 = file_sha256(args.input)
+            chunking = chunking_config(
+                args.chunk_size, args.overlap,
+                None if args.full_book else args.max_chunks,
+                embedder.span if embedder else None
+            )
+            key = result_key(sha256, chunking, args.model, store.version)
+            stored = None if args.force else get_result_store().get(key)
+            if stored is not None:
+                print(f"Using stored result {key[:12]} (--force to recompute)", file=sys.stderr)
+                stored['book_title'] = title
+                print(json.dumps(stored, separators=(',', ':')))
+                sys.exit(0)
+            get_chunk_store().begin_book(sha256, args.model, title, chunking)
+
+        source = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8')
+        with source:
+            chunks = iter_text_chunks(
+                source, title, args.chunk_size, args.overlap,
+                None if args.full_book else args.max_chunks
+            )
+            aggregator = GenreAggregator(len(prototypes))
+            for batch in iter_batches(chunks, args.batch_size):
+                if embedder:
+                    embedder.embed_batch(batch)
+                else:
+                    embed_full(batch, args.model)
+                if key:
+                    get_chunk_store().add_chunks(sha256, args.model, batch)
+                aggregator.add_batch(batch, prototypes)
+                print(f"Processed {aggregator.total_chunks} chunks", file=sys.stderr)
+
+        if not aggregator.total_chunks:
+            raise ValueError("No text found in manuscript")
+
+        result = aggregator.result(prototypes)
+        if key:
+            get_result_store().put(key, sha256, chunking, args.model, store.version, result)
+            print(f"Book id: {sha256[:12]}", file=sys.stderr)
+        print(json.dumps(result, separators=(',', ':')))
+        sys.exit(0)
+
+    except Exception as e:
+        print(json.dumps({'error': str(e)}), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped export of the subgenre prototypes.
+The normalized prototype matrix is written to a plain .npy file next to the
+database (subgenres.matrix.npy), with a JSON sidecar holding ids, names,
+prototype texts, model, dims and the DB snapshot it was built from
+(subgenres.matrix.json). PrototypeStore maps the matrix read-only when the
+sidecar matches the DB, so a scorer starts without decoding any rows and
+every process shares the same pages through the OS page cache.
+An int8 copy for the two-pass scorer (quantized_matrix.py) is written
+alongside as subgenres.matrix.int8.npy and subgenres.matrix.scales.npy.
+
+The export is refreshed by import_and_generate_embeddings.py --incremental
+and migrate_subgenres_db.py. A stale or missing export is ignored and the
+DB is read as before.
+
+Usage:
+    python3 prototype_matrix.py export
+    python3 prototype_matrix.py info
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from quantized_matrix import CODE_DTYPE, QuantizedMatrix, quantize
+from similarity_engine import Prototypes
+from subgenres_db import DB_PATH, EMBEDDING_DTYPE, db_mtime
+
+FORMAT_VERSION = 1
+
+
+def matrix_paths(db_path=DB_PATH):
+    """(matrix .npy, metadata .json) stored alongside the database."""
+    db_path = Path(db_path)
+    return db_path.with_name(db_path.stem + '.matrix.npy'), db_path.with_name(db_path.stem + '.matrix.json')
+
+
+def quantized_paths(db_path=DB_PATH):
+    """(int8 codes .npy, float32 scales .npy) stored alongside the database."""
+    db_path = Path(db_path)
+    return db_path.with_name(db_path.stem + '.matrix.int8.npy'), db_path.with_name(db_path.stem + '.matrix.scales.npy')
+
+
+def _save_npy(path, array):
+    tmp_path = path.with_suffix('.npy.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def export_matrix(db_path=DB_PATH):
+    """Write the normalized matrix and its sidecar for the DB's current rows; returns the metadata."""
+    matrix_path, meta_path = matrix_paths(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        prototypes = Prototypes.from_connection(conn)
+        models = sorted({r[0] for r in conn.execute('SELECT DISTINCT embedding_model FROM subgenres') if r[0]})
+    finally:
+        conn.close()
+    # Taken after the connection is closed, so it matches what readers will see
+    mtime = db_mtime(db_path)
+
+    meta = {
+        'format': FORMAT_VERSION,
+        'rows': len(prototypes),
+        'dims': int(prototypes.matrix.shape[1]),
+        'dtype': EMBEDDING_DTYPE.str,
+        'model': models[0] if len(models) == 1 else models,
+        'version': prototypes.content_hash(),
+        'source_mtime_ns': mtime,
+        'quantized': CODE_DTYPE.str,
+        'ids': prototypes.ids,
+        'parent_genre': prototypes.parent_genres,
+        'sub_genre': prototypes.sub_genres,
+        'prototype_text': prototypes.prototype_texts
+    }
+
+    # Matrices first, sidecar last: a reader never sees new metadata with an old matrix
+    _save_npy(matrix_path, np.ascontiguousarray(prototypes.matrix, dtype=EMBEDDING_DTYPE))
+    codes, scales = quantize(prototypes.matrix)
+    codes_path, scales_path = quantized_paths(db_path)
+    _save_npy(codes_path, codes)
+    _save_npy(scales_path, scales)
+    tmp_meta = meta_path.with_suffix('.json.tmp')
+    with open(tmp_meta, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, meta_path)
+    return meta
+
+
+def read_metadata(db_path=DB_PATH):
+    """Sidecar metadata, or None if there is no export."""
+    _, meta_path = matrix_paths(db_path)
+    try:
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_matrix(db_path=DB_PATH, mtime=None):
+    """
+    (Prototypes over a read-only memory map, taxonomy version), or None when
+    there is no export or it was built from a different DB snapshot.
+    """
+    matrix_path, _ = matrix_paths(db_path)
+    meta = read_metadata(db_path)
+    if meta is None or meta.get('format') != FORMAT_VERSION:
+        return None
+    if meta['source_mtime_ns'] != (mtime if mtime is not None else db_mtime(db_path)):
+        return None
+    try:
+        matrix = np.load(matrix_path, mmap_mode='r')
+    except FileNotFoundError:
+        return None
+    if matrix.shape != (meta['rows'], meta['dims']) or matrix.dtype != EMBEDDING_DTYPE:
+        return None
+    prototypes = Prototypes(
+        meta['ids'], meta['parent_genre'], meta['sub_genre'], meta['prototype_text'],
+        matrix, normalized=True
+    )
+    return prototypes, meta['version']
+
+
+def load_quantized(db_path=DB_PATH, mtime=None):
+    """
+    QuantizedMatrix over read-only memory maps of the exported int8 codes, or
+    None when the export has none or was built from a different DB snapshot.
+    """
+    meta = read_metadata(db_path)
+    if meta is None or meta.get('format') != FORMAT_VERSION or meta.get('quantized') != CODE_DTYPE.str:
+        return None
+    if meta['source_mtime_ns'] != (mtime if mtime is not None else db_mtime(db_path)):
+        return None
+    codes_path, scales_path = quantized_paths(db_path)
+    try:
+        codes = np.load(codes_path, mmap_mode='r')
+        scales = np.load(scales_path, mmap_mode='r')
+    except FileNotFoundError:
+        return None
+    if codes.shape != (meta['rows'], meta['dims']) or scales.shape != (meta['rows'],):
+        return None
+    return QuantizedMatrix(codes, scales)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory-mapped prototype matrix")
+    parser.add_argument("command", choices=["export", "info"])
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="Path to subgenres.db")
+    args = parser.parse_args()
+
+    matrix_path, meta_path = matrix_paths(args.db)
+    if args.command == "export":
+        meta = export_matrix(args.db)
+        print(f"✅ Exported {meta['rows']} x {meta['dims']} matrix (taxonomy {meta['version']})")
+        print(f"📁 {matrix_path}")
+        print(f"📁 {meta_path}")
+        print(f"📁 {quantized_paths(args.db)[0]}")
+        return
+
+    meta = read_metadata(args.db)
+    if meta is None:
+        print(f"⚠️  No export at {meta_path}; run: python3 prototype_matrix.py export")
+        return
+    current = meta['source_mtime_ns'] == db_mtime(args.db)
+    quantized = f" + {np.dtype(meta['quantized']).name} copy" if meta.get('quantized') else ''
+    print(f"{'✅' if current else '⚠️ '} {meta['rows']} x {meta['dims']} {meta['dtype']}{quantized}, model {meta['model']}, "
+          f"taxonomy {meta['version']} ({'current' if current else 'stale: subgenres.db changed, re-export'})")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(json.dumps({'error': str(e)}), file=sys.stderr)
+        sys.exit(1)
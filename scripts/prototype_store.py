@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Process-wide cache of the subgenre prototypes.
+The table is read once into a normalized matrix (see similarity_engine.Prototypes)
+and only re-read when the database file changes on disk. When a current
+memory-mapped export exists (prototype_matrix.py), it is mapped instead of
+reading the table. The int8 copy for two-pass scoring (quantized_matrix.py)
+is mapped from the export too, or built from the loaded matrix.
+"""
+import sqlite3
+import threading
+from pathlib import Path
+
+from prototype_matrix import load_matrix, load_quantized
+from quantized_matrix import QuantizedMatrix
+from similarity_engine import Prototypes
+from subgenres_db import DB_PATH, db_mtime
+
+
+class PrototypeStore:
+    """Loads subgenres.db once and reloads it only when its mtime changes."""
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = Path(db_path)
+        self.loads = 0
+        self._lock = threading.Lock()
+        self._prototypes = None
+        self._mtime = None
+        # (prototypes snapshot, content hash) computed on first use
+        self._version = None
+        # (prototypes snapshot, QuantizedMatrix) built on first use
+        self._quantized = None
+        # 'mmap' or 'sqlite' for the current snapshot
+        self.source = None
+
+    def get(self):
+        """Current prototypes, reloading first if the DB changed since the last load."""
+        mtime = db_mtime(self.db_path)
+        with self._lock:
+            if self._prototypes is None or mtime != self._mtime:
+                mapped = load_matrix(self.db_path, mtime)
+                if mapped is not None:
+                    self._prototypes, version = mapped
+                    self._version = (self._prototypes, version)
+                    self.source = 'mmap'
+                else:
+                    conn = sqlite3.connect(self.db_path)
+                    try:
+                        self._prototypes = Prototypes.from_connection(conn)
+                    finally:
+                        conn.close()
+                    self.source = 'sqlite'
+                self._mtime = mtime
+                self.loads += 1
+            return self._prototypes
+
+    @property
+    def count(self):
+        """Number of prototype rows currently loaded."""
+        return len(self._prototypes) if self._prototypes is not None else 0
+
+    @property
+    def version(self):
+        """
+        Content hash of the current taxonomy (names, prototype texts and vectors),
+        so results computed against it can be cached. Unchanged by a touch or VACUUM.
+        """
+        prototypes = self.get()
+        with self._lock:
+            if self._version is None or self._version[0] is not prototypes:
+                self._version = (prototypes, prototypes.content_hash())
+            return self._version[1]
+
+    def quantized(self):
+        """Int8 copy of the current matrix: the exported one when mapped, else built in memory."""
+        prototypes = self.get()
+        with self._lock:
+            if self._quantized is None or self._quantized[0] is not prototypes:
+                quantized = None
+                if self.source == 'mmap':
+                    quantized = load_quantized(self.db_path, self._mtime)
+                if quantized is None:
+                    quantized = QuantizedMatrix.build(prototypes.matrix)
+                self._quantized = (prototypes, quantized)
+            return self._quantized[1]
+
+    @property
+    def mtime(self):
+        """DB mtime (seconds) of the currently loaded snapshot, or None before the first load."""
+        return self._mtime / 1e9 if self._mtime is not None else None
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(db_path=DB_PATH):
+    """Shared PrototypeStore for a DB path, created on first use."""
+    key = str(Path(db_path).resolve())
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = PrototypeStore(db_path)
+        return _stores[key]
+
+
+def load_prototypes(db_path=DB_PATH):
+    """Convenience wrapper: current prototypes from the shared store."""
+    return get_store(db_path).get()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Int8 copy of the prototype matrix for a two-pass scorer.
+Every normalized prototype row is stored as int8 codes plus one float32
+scale (max |value| / 127), a quarter of the float32 size. A query is first
+scored against the int8 rows, then its top RERANK candidates are re-scored
+exactly against the float32 rows and ranked as the exact scorer would.
+With a memory-mapped float32 matrix (prototype_matrix.py), only the
+candidate rows are ever paged in. The first pass widens int8 blocks to
+float32 (numpy has no int8 matrix product), so it is slower than exact
+scoring: this is a memory option for the long-running service, not a
+speed-up.
+
+The codes are written next to the matrix export by prototype_matrix.py, so
+import_and_generate_embeddings.py builds them at import time; without an
+export they are computed from the loaded matrix (PrototypeStore.quantized).
+
+Usage:
+    python3 quantized_matrix.py report [--rerank 20 48 100] [--queries /tmp/n8n_chunks.json]
+    python3 similarity_server.py --int8 48
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from chunk_reader import iter_chunks
+from similarity_engine import TOP_K, l2_normalize, score_matrix, stack_embeddings, top_k
+from subgenres_db import DB_PATH, EMBEDDING_DTYPE
+
+DEFAULT_RERANK = 48
+CODE_DTYPE = np.dtype(np.int8)
+# Int8 rows widened to float32 at a time in the first pass (the buffer stays in cache)
+DECODE_ROWS = 256
+# Queries re-ranked together; bounds the gathered (queries x candidates x dims) block
+RERANK_BLOCK = 64
+
+
+def quantize(matrix):
+    """(int8 codes, float32 per-row scales) with matrix ~= codes * scales[:, None]."""
+    matrix = np.asarray(matrix, dtype=EMBEDDING_DTYPE)
+    scales = np.abs(matrix).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(CODE_DTYPE)
+    return codes, scales.astype(EMBEDDING_DTYPE)
+
+
+class QuantizedMatrix:
+    """Int8 prototype rows with per-row scales; search() re-ranks exactly in float32."""
+
+    def __init__(self, codes, scales):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def build(cls, matrix):
+        return cls(*quantize(matrix))
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+    def approximate(self, queries):
+        """Approximate cosine scores of normalized queries against every row, shape (rows, queries)."""
+        scores = np.empty((len(self.codes), len(queries)), dtype=np.float32)
+        buffer = np.empty((min(DECODE_ROWS, len(self.codes)), self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(self.codes), DECODE_ROWS):
+            stop = min(start + DECODE_ROWS, len(self.codes))
+            decoded = buffer[:stop - start]
+            decoded[:] = self.codes[start:stop]
+            np.matmul(decoded, queries.T, out=scores[start:stop])
+        scores *= self.scales[:, None]
+        return scores
+
+    def search(self, embeddings, prototype_matrix, k=TOP_K, rerank=DEFAULT_RERANK):
+        """
+        Top-k for raw chunk embeddings: the best `rerank` rows by int8 score,
+        re-scored against the float32 matrix. Same signature as
+        IVFIndex.search, so it plugs into score_chunks and GenreAggregator
+        (used by similarity_server.py --int8).
+        """
+        queries = l2_normalize(embeddings)
+        k = min(k, len(self.codes))
+        rerank = min(max(rerank or DEFAULT_RERANK, k), len(self.codes))
+
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        for start in range(0, len(queries), RERANK_BLOCK):
+            block = queries[start:start + RERANK_BLOCK]
+            if rerank < len(self.codes):
+                # Negated into a row per query: partitioning along contiguous rows is far cheaper
+                negated = np.negative(self.approximate(block).T, out=np.empty((len(block), len(self.codes)), np.float32))
+                candidates = np.argpartition(negated, rerank - 1, axis=1)[:, :rerank]
+            else:
+                candidates = np.broadcast_to(np.arange(rerank), (len(block), rerank))
+            # Table order, so top_k breaks ties like the exact scorer
+            candidates = np.sort(candidates, axis=1)
+            exact = np.matmul(prototype_matrix[candidates], block[:, :, None])[:, :, 0]
+            best, best_scores = top_k(exact, k)
+            indices[start:start + len(block)] = np.take_along_axis(candidates, best, axis=1)
+            scores[start:start + len(block)] = best_scores
+        return indices, scores
+
+
+def rerank_report(quantized, prototypes, queries, reranks, k=TOP_K):
+    """Compare int8 + re-rank top-k lists with exact float32 scoring for each re-rank depth."""
+    start = time.perf_counter()
+    exact_idx, exact_scores = score_matrix(queries, prototypes.matrix, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    rows = []
+    for rerank in reranks:
+        start = time.perf_counter()
+        idx, scores = quantized.search(queries, prototypes.matrix, k, rerank)
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        rows.append({
+            'rerank': rerank,
+            'order_changed': float(np.mean((idx != exact_idx).any(axis=1))),
+            'recall_at_k': float(np.mean([len(set(a) & set(b)) / k for a, b in zip(idx.tolist(), exact_idx.tolist())])),
+            'max_score_error': float(np.abs(scores - exact_scores).max()),
+            'ms_per_query': ms,
+            'exact_ms_per_query': exact_ms
+        })
+    return rows
+
+
+def main():
+    # prototype_store -> prototype_matrix imports this module for the export
+    from prototype_store import get_store
+
+    parser = argparse.ArgumentParser(description="Int8 prototype matrix with float32 re-ranking")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--db", default=str(DB_PATH), help="Path to subgenres.db")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[TOP_K, DEFAULT_RERANK, 100],
+                        help="Candidates re-scored in float32 per chunk")
+    parser.add_argument("--queries", help="Chunk file to validate on (default: noisy prototypes)")
+    parser.add_argument("--limit", type=int, default=2000, help="Max validation chunks")
+    args = parser.parse_args()
+
+    store = get_store(args.db)
+    prototypes = store.get()
+    quantized = store.quantized()
+    dims = prototypes.matrix.shape[1]
+    if args.queries:
+        queries = stack_embeddings(list(iter_chunks(args.queries))[:args.limit], dims)
+    else:
+        rng = np.random.default_rng(0)
+        rows = rng.choice(len(prototypes), min(args.limit, len(prototypes)), replace=False)
+        queries = prototypes.matrix[rows] + rng.normal(0, 0.05, (len(rows), dims)).astype(np.float32)
+    if not len(queries):
+        raise ValueError("No validation chunks")
+
+    float_mb = len(prototypes) * dims * EMBEDDING_DTYPE.itemsize / 1e6
+    print(f"🗜️  {len(prototypes)} x {dims}: int8 {quantized.nbytes / 1e6:.2f} MB vs float32 {float_mb:.2f} MB "
+          f"({store.source} prototypes)")
+    print(f"📊 Int8 + re-rank vs exact top-{TOP_K} ({len(queries)} chunks)")
+    for row in rerank_report(quantized, prototypes, queries, args.rerank):
+        print(f"   rerank={row['rerank']:<4d} order changed={row['order_changed']:.1%}  "
+              f"recall@{TOP_K}={row['recall_at_k']:.3f}  max score error={row['max_score_error']:.1e}  "
+              f"{row['ms_per_query']:.3f} ms/chunk (exact {row['exact_ms_per_query']:.3f})")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(json.dumps({'error': str(e)}), file=sys.stderr)
+        sys.exit(1)
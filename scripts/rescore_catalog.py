@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Re-score every stored book against the current taxonomy in one batch job.
+Chunk embeddings come from the chunk store (chunk_store.py). Chunks from
+many books are packed into large blocks, and each block is scored with one
+matrix product against the prototype matrix. The top-k rows are then split
+back into per-book aggregates.
+
+Each book's aggregate is written as JSON to the output directory (default
+data/rescored/<taxonomy version>/), with a catalog.jsonl summary line per book.
+
+Usage:
+    python3 rescore_catalog.py [--model snowflake-arctic-embed] [--output-dir DIR]
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from chunk_store import get_chunk_store
+from genre_aggregator import GenreAggregator
+from prototype_store import get_store
+from similarity_engine import TOP_K, score_matrix
+from subgenres_db import DATA_DIR, EMBEDDING_DTYPE
+
+# Memory budget for one block's embeddings plus its score matrix
+BLOCK_BYTES = 256 * 1024 * 1024
+MAX_BLOCK_ROWS = 16384
+
+
+def block_rows(n_genres, dims):
+    """Rows per block so the block and its score matrix fit in BLOCK_BYTES."""
+    return int(max(256, min(MAX_BLOCK_ROWS, BLOCK_BYTES // (4 * (n_genres + dims)))))
+
+
+def result_filename(book_id, model):
+    safe_model = re.sub(r'[^\w.-]', '_', model)
+    return f"{book_id}_{safe_model}.json"
+
+
+def rescore_catalog(prototypes, output_dir, taxonomy_version, model=None, k=TOP_K, rows_per_block=None, progress=None):
+    """
+    Score all stored chunks in blocks and write one aggregate per book.
+    Returns throughput statistics.
+    """
+    dims = prototypes.matrix.shape[1]
+    rows_per_block = rows_per_block or block_rows(len(prototypes), dims)
+    block = np.empty((rows_per_block, dims), dtype=np.float32)
+    # (book key, light chunk dict) for each row in the block
+    meta = []
+    aggregators = {}
+    stats = {'books': 0, 'chunks': 0, 'blocks': 0, 'score_seconds': 0.0}
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    summary = open(output_dir / 'catalog.jsonl', 'w')
+
+    def write_book(key):
+        book_id, book_model = key
+        aggregator = aggregators.pop(key)
+        result = aggregator.result(prototypes)
+        result.update(book_id=book_id, model=book_model, taxonomy_version=taxonomy_version)
+        with open(output_dir / result_filename(book_id, book_model), 'w') as f:
+            json.dump(result, f, separators=(',', ':'))
+        top = result['top_20_genres'][0] if result['top_20_genres'] else {}
+        summary.write(json.dumps({
+            'book_id': book_id,
+            'model': book_model,
+            'book_title': result['book_title'],
+            'total_chunks': result['total_chunks'],
+            'top_subgenre': top.get('subgenre'),
+            'top_parent': top.get('parent'),
+            'top_votes': top.get('votes')
+        }) + '\n')
+        stats['books'] += 1
+
+    def score_block(n, last):
+        start = time.perf_counter()
+        indices, scores = score_matrix(block[:n], prototypes.matrix, k)
+        stats['score_seconds'] += time.perf_counter() - start
+
+        # Rows are grouped by book: fold each book's run of rows into its aggregate
+        row = 0
+        while row < n:
+            key = meta[row][0]
+            end = row
+            while end < n and meta[end][0] == key:
+                end += 1
+            aggregators.setdefault(key, GenreAggregator(len(prototypes), k)).add_scores(
+                [m[1] for m in meta[row:end]], indices[row:end], scores[row:end]
+            )
+            row = end
+
+        # Only the block's last book can continue into the next block
+        for key in list(aggregators):
+            if last or key != meta[n - 1][0]:
+                write_book(key)
+        stats['chunks'] += n
+        stats['blocks'] += 1
+        meta.clear()
+        if progress:
+            progress(stats)
+
+    started = time.perf_counter()
+    try:
+        for book_id, book_model, title, number, preview, blob in get_chunk_store().iter_catalog(dims, model):
+            i = len(meta)
+            block[i] = np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+            meta.append(((book_id, book_model), {
+                'book_title': title or 'Unknown',
+                'chunk_number': number,
+                'chunk_text': preview
+            }))
+            if len(meta) == rows_per_block:
+                score_block(len(meta), last=False)
+        if meta:
+            score_block(len(meta), last=True)
+        for key in list(aggregators):
+            write_book(key)
+    finally:
+        summary.close()
+
+    stats['seconds'] = time.perf_counter() - started
+    stats['rows_per_block'] = rows_per_block
+    stats['chunks_per_sec'] = stats['chunks'] / stats['seconds'] if stats['seconds'] else 0.0
+    stats['books_per_min'] = stats['books'] * 60 / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score all stored books against the current taxonomy")
+    parser.add_argument("--model", help="Only books embedded with this model")
+    parser.add_argument("--output-dir", type=Path, help="Where to write aggregates (default: data/rescored/<taxonomy version>)")
+    parser.add_argument("--block-rows", type=int, help="Chunks per matrix product (default: sized to BLOCK_BYTES)")
+    args = parser.parse_args()
+
+    store = get_store()
+    prototypes = store.get()
+    version = store.version
+    output_dir = args.output_dir or DATA_DIR / "rescored" / version
+
+    books = get_chunk_store().books(args.model)
+    skipped = [b for b in books if b['dim'] != prototypes.matrix.shape[1]]
+    print(f"📚 Re-scoring {len(books) - len(skipped)} books against {len(prototypes)} subgenres "
+          f"(taxonomy {version})", file=sys.stderr)
+    if skipped:
+        print(f"⚠️  Skipping {len(skipped)} books whose embedding size doesn't match subgenres.db", file=sys.stderr)
+
+    stats = rescore_catalog(
+        prototypes, output_dir, version, args.model, rows_per_block=args.block_rows,
+        progress=lambda s: print(f"Scored {s['chunks']} chunks, {s['books']} books written", file=sys.stderr)
+    )
+
+    print(f"✅ Re-scored {stats['books']} books ({stats['chunks']} chunks) in {stats['seconds']:.2f}s")
+    print(f"   Throughput: {stats['chunks_per_sec']:.0f} chunks/sec, {stats['books_per_min']:.1f} books/min")
+    print(f"   Matrix products: {stats['blocks']} blocks of up to {stats['rows_per_block']} chunks, "
+          f"{stats['score_seconds']:.2f}s scoring")
+    print(f"📁 {output_dir}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(json.dumps({'error': str(e)}), file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Local store of finished book results, so the same manuscript is not
+processed twice. A result is keyed by the sha256 of the uploaded file plus
+everything that changes the output: the chunking config, the embedding model
+and the taxonomy version (see PrototypeStore.version).
+Keys of uploads still waiting for their report are kept in a pending table,
+so a callback that arrives after a server restart can still be stored.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from chunker import CHUNK_SIZE, MAX_CHUNKS, OVERLAP_PERCENT, USE_FULL_BOOK
+from subgenres_db import DATA_DIR
+
+RESULTS_PATH = Path(os.getenv("RESULT_STORE", DATA_DIR / "results.db"))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    result_key TEXT PRIMARY KEY,
+    file_sha256 TEXT NOT NULL,
+    chunking TEXT NOT NULL,
+    model TEXT NOT NULL,
+    taxonomy_version TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_file ON results (file_sha256);
+CREATE TABLE IF NOT EXISTS pending (
+    result_key TEXT PRIMARY KEY,
+    file_sha256 TEXT NOT NULL,
+    chunking TEXT NOT NULL,
+    model TEXT NOT NULL,
+    taxonomy_version TEXT NOT NULL,
+    job_id TEXT,
+    created_at REAL NOT NULL
+);
+'''
+
+
+def chunking_config(chunk_size=CHUNK_SIZE, overlap_percent=OVERLAP_PERCENT,
+                    max_chunks=None if USE_FULL_BOOK else MAX_CHUNKS, pooled_span=None):
+    """The chunking settings that affect a result (defaults match the n8n node)."""
+    return {
+        'chunk_size': chunk_size,
+        'overlap_percent': overlap_percent,
+        'max_chunks': max_chunks,
+        'pooled_span': pooled_span
+    }
+
+
+def result_key(file_sha256, chunking, model, taxonomy_version):
+    """Stable key for one (file, chunking, model, taxonomy) combination."""
+    material = json.dumps([file_sha256, chunking, model, taxonomy_version], sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    """sha256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultStore:
+    """result_key -> stored aggregate result."""
+
+    def __init__(self, path=RESULTS_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+
+    def get(self, key):
+        """Stored result for a key, or None."""
+        with self._lock:
+            row = self.conn.execute('SELECT result FROM results WHERE result_key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, file_sha256, chunking, model, taxonomy_version, result):
+        """Store (or replace) the result for a key; it is no longer pending."""
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM pending WHERE result_key = ?', (key,))
+            self.conn.execute(
+                'INSERT OR REPLACE INTO results '
+                '(result_key, file_sha256, chunking, model, taxonomy_version, created_at, result) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, file_sha256, json.dumps(chunking, sort_keys=True), model, taxonomy_version,
+                 time.time(), json.dumps(result, separators=(',', ':')))
+            )
+
+    def add_pending(self, key, file_sha256, chunking, model, taxonomy_version, job_id=None):
+        """Record an upload whose report the workflow has not posted back yet."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO pending '
+                '(result_key, file_sha256, chunking, model, taxonomy_version, job_id, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, file_sha256, json.dumps(chunking, sort_keys=True), model, taxonomy_version,
+                 job_id, time.time())
+            )
+
+    def pending(self, key):
+        """Metadata of a pending upload (file_sha256, chunking, model, taxonomy_version, job_id), or None."""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT file_sha256, chunking, model, taxonomy_version, job_id FROM pending WHERE result_key = ?',
+                (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'file_sha256': row[0], 'chunking': json.loads(row[1]), 'model': row[2],
+                'taxonomy_version': row[3], 'job_id': row[4]}
+
+    def delete(self, key):
+        with self._lock, self.conn:
+            return self.conn.execute('DELETE FROM results WHERE result_key = ?', (key,)).rowcount
+
+    def close(self):
+        self.conn.close()
+
+
+_store = None
+
+
+def get_result_store():
+    """Process-wide result store, opened on first use."""
+    global _store
+    if _store is None:
+        _store = ResultStore()
+    return _store
@@ -2,43 +2,182 @@
 """
 Simple HTTP server to serve subgenres.json file.
 Run this in the background, then use HTTP Request node in n8n.
+
+The file is parsed once and served from a pre-serialized compact body (plus
+a gzip copy), rebuilt only when the file's mtime changes. Responses carry an
+ETag, so clients sending If-None-Match get a 304 when nothing changed.
+?fields=parent_genre,sub_genre returns only those fields, e.g. labels
+without the embedding vectors.
+
+Usage:
+    python3 serve_subgenres.py [--port 8765]
+    curl -s --compressed 'http://localhost:8765/subgenres.json?fields=id,parent_genre,sub_genre'
 """
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+import argparse
+import gzip
+import hashlib
 import json
 import os
+import threading
+
+from subgenres_db import SUBGENRES_FILE
 
 PORT = 8765
 
-class SubgenresHandler(SimpleHTTPRequestHandler):
-    def do_GET(self):
-        if self.path == '/subgenres.json' or self.path == '/':
-            filepath = '/Users/eerogetlost/book-processor-local/data/subgenres.json'
-            
-            try:
-                with open(filepath, 'r') as f:
-                    data = json.load(f)
-                
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                
-                # Send compact JSON
-                self.wfile.write(json.dumps(data, separators=(',', ':')).encode('utf-8'))
-                
-            except Exception as e:
-                self.send_response(500)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': str(e)}).encode('utf-8'))
-        else:
-            self.send_response(404)
+
+def project(subgenres, fields):
+    """Subgenres reduced to the given fields (all fields when None)."""
+    if fields is None:
+        return subgenres
+    return [{f: genre[f] for f in fields if f in genre} for genre in subgenres]
+
+
+class SubgenresCache:
+    """Pre-serialized response bodies per field projection, dropped when the file changes."""
+
+    def __init__(self, path=SUBGENRES_FILE):
+        self.path = path
+        self.loads = 0
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._subgenres = None
+        # Field names in file order
+        self._fields = []
+        # fields tuple (or None) -> (etag, body, gzip body)
+        self._variants = {}
+
+    def _reload(self):
+        stat = os.stat(self.path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp != self._stamp:
+            with open(self.path, 'r') as f:
+                self._subgenres = json.load(f)
+            self._fields = list(dict.fromkeys(key for genre in self._subgenres for key in genre))
+            self._variants = {}
+            self._stamp = stamp
+            self.loads += 1
+
+    def get(self, fields=None):
+        """(etag, body, gzip body) for a projection; raises ValueError on unknown fields."""
+        with self._lock:
+            self._reload()
+            if fields is not None:
+                unknown = [f for f in fields if f not in self._fields]
+                if unknown:
+                    raise ValueError(f"Unknown fields: {', '.join(unknown)} "
+                                     f"(available: {', '.join(self._fields)})")
+                # File order, so each subset of fields is cached once
+                fields = tuple(f for f in self._fields if f in fields)
+            if fields not in self._variants:
+                body = json.dumps(project(self._subgenres, fields), separators=(',', ':')).encode('utf-8')
+                etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+                self._variants[fields] = (etag, body, gzip.compress(body, compresslevel=6, mtime=0))
+            return self._variants[fields]
+
+
+def etag_matches(header, etag):
+    """If-None-Match check: '*' or any listed tag, weak or strong."""
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(',')]
+    return '*' in tags or any(t.removeprefix('W/') == etag for t in tags)
+
+
+def accepts_gzip(header):
+    """True if Accept-Encoding allows gzip (and doesn't give it q=0)."""
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding.strip().lower() in ('gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+class SubgenresServer(ThreadingHTTPServer):
+    # Parallel n8n executions connect at once; the default backlog of 5 drops them
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class SubgenresHandler(BaseHTTPRequestHandler):
+    cache = None
+
+    def send_error_json(self, status, message):
+        body = json.dumps({'error': message}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def respond(self, head=False):
+        url = urlparse(self.path)
+        if url.path not in ('/subgenres.json', '/'):
+            self.send_error_json(404, f'Unknown path {url.path}')
+            return
+
+        fields = parse_qs(url.query).get('fields')
+        if fields:
+            fields = [f.strip() for value in fields for f in value.split(',') if f.strip()]
+        try:
+            etag, body, gzipped = self.cache.get(fields or None)
+        except ValueError as e:
+            self.send_error_json(400, str(e))
+            return
+        except Exception as e:
+            self.send_error_json(500, str(e))
+            return
+
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
             self.end_headers()
+            return
 
-if __name__ == '__main__':
-    os.chdir('/Users/eerogetlost/book-processor-local/data')
-    server = HTTPServer(('localhost', PORT), SubgenresHandler)
-    print(f'🌐 Serving subgenres.json at http://localhost:{PORT}/subgenres.json')
+        use_gzip = accepts_gzip(self.headers.get('Accept-Encoding'))
+        payload = gzipped if use_gzip else body
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(payload)
+
+    def do_GET(self):
+        self.respond()
+
+    def do_HEAD(self):
+        self.respond(head=True)
+
+    def log_message(self, format, *args):
+        # Keep stdout quiet; n8n polls this on every execution
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve subgenres.json over HTTP")
+    parser.add_argument("--host", default="localhost", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=PORT, help="Port to run on")
+    parser.add_argument("--file", default=str(SUBGENRES_FILE), help="Path to subgenres.json")
+    args = parser.parse_args()
+
+    SubgenresHandler.cache = SubgenresCache(args.file)
+    # Parse and serialize up front so the first request doesn't pay for it
+    SubgenresHandler.cache.get()
+
+    server = SubgenresServer((args.host, args.port), SubgenresHandler)
+    print(f'🌐 Serving subgenres.json at http://{args.host}:{args.port}/subgenres.json')
     print('Press Ctrl+C to stop')
     server.serve_forever()
 
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Vectorized similarity scoring shared by all scoring scripts.
+Normalizes the subgenre matrix once and scores a whole batch of chunks
+with a single matrix product instead of a pure-Python loop per pair.
+"""
+import hashlib
+
+import numpy as np
+
+from subgenres_db import decode_embedding
+
+TOP_K = 20
+
+
+def l2_normalize(matrix):
+    """Scale every row to unit length (all-zero rows stay zero)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class Prototypes:
+    """Subgenre prototypes as a normalized matrix plus parallel metadata lists."""
+
+    def __init__(self, ids, parent_genres, sub_genres, prototype_texts, matrix, normalized=False):
+        self.ids = ids
+        self.parent_genres = parent_genres
+        self.sub_genres = sub_genres
+        self.prototype_texts = prototype_texts
+        # An already-normalized matrix (e.g. a read-only memory map) is used as is
+        self.matrix = matrix if normalized else l2_normalize(matrix)
+
+    @classmethod
+    def from_connection(cls, conn):
+        """Load every row of the subgenres table."""
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, parent_genre, sub_genre, prototype_text, embedding FROM subgenres')
+        rows = cursor.fetchall()
+        if not rows:
+            raise ValueError("No subgenres found in database")
+
+        return cls(
+            [r[0] for r in rows],
+            [r[1] for r in rows],
+            [r[2] for r in rows],
+            [r[3] for r in rows],
+            np.stack([decode_embedding(r[4]) for r in rows]),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def content_hash(self):
+        """Short sha256 of names, prototype texts and vectors (the taxonomy version)."""
+        digest = hashlib.sha256()
+        for values in (self.parent_genres, self.sub_genres, self.prototype_texts):
+            digest.update('\0'.join(str(v) for v in values).encode('utf-8'))
+            digest.update(b'\1')
+        digest.update(np.ascontiguousarray(self.matrix).tobytes())
+        return digest.hexdigest()[:16]
+
+
+def stack_embeddings(chunks, dims):
+    """Stack the 'embedding' field of every chunk into one float32 array."""
+    matrix = np.empty((len(chunks), dims), dtype=np.float32)
+    for i, chunk in enumerate(chunks):
+        embedding = chunk['embedding']
+        if len(embedding) != dims:
+            raise ValueError(f"Vector length mismatch: {len(embedding)} vs {dims}")
+        matrix[i] = embedding
+    return matrix
+
+
+def top_k(scores, k=TOP_K):
+    """
+    Return (indices, scores) of the k best columns per row, best first.
+    Ties keep table order, matching the old stable Python sort.
+    """
+    n = scores.shape[1]
+    k = min(k, n)
+    if k < n:
+        idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.broadcast_to(np.arange(n), scores.shape).copy()
+    part = np.take_along_axis(scores, idx, axis=1)
+    order = np.lexsort((idx, -part), axis=1)
+    idx = np.take_along_axis(idx, order, axis=1)
+    return idx, np.take_along_axis(scores, idx, axis=1)
+
+
+def score_matrix(embeddings, prototype_matrix, k=TOP_K):
+    """Top-k cosine scores of raw chunk embeddings against a normalized prototype matrix."""
+    if len(embeddings) == 0:
+        empty = np.empty((0, min(k, len(prototype_matrix))))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    scores = l2_normalize(embeddings) @ prototype_matrix.T
+    return top_k(scores, k)
+
+
+def score_chunks(chunks, prototypes, k=TOP_K, index=None, nprobe=None):
+    """
+    Cosine-score a batch of chunks against all prototypes in one matmul,
+    or through an index when one is given (the probed clusters of an ANN
+    index, or an int8 first pass re-ranked in float32).
+    """
+    embeddings = stack_embeddings(chunks, prototypes.matrix.shape[1])
+    if index is not None and len(embeddings):
+        return index.search(embeddings, prototypes.matrix, k, nprobe)
+    return score_matrix(embeddings, prototypes.matrix, k)
+
+
+def top_genres(indices, scores, prototypes):
+    """Build the top_genres list for one chunk from its top-k row."""
+    return [
+        {
+            'subgenre': prototypes.sub_genres[i],
+            'parent_genre': prototypes.parent_genres[i],
+            'prototype_text': prototypes.prototype_texts[i],
+            'similarity': float(s)
+        }
+        for i, s in zip(indices.tolist(), scores.tolist())
+    ]
+
+
+def chunk_result(chunk_data, indices, scores, prototypes):
+    """Per-chunk output record shared by the JSONL scorers."""
+    return {
+        'book_title': chunk_data.get('book_title', 'Unknown'),
+        'chunk_number': chunk_data.get('chunk_number', 0),
+        'chunk_text': chunk_data.get('chunk_text', '')[:500],
+        'top_genres': top_genres(indices, scores, prototypes)
+    }
+
+
+def calculate_similarity_for_chunks(chunks, prototypes, k=TOP_K, index=None, nprobe=None):
+    """Score a batch of chunks and return one result record per chunk."""
+    indices, scores = score_chunks(chunks, prototypes, k, index, nprobe)
+    return [
+        chunk_result(chunk, indices[i], scores[i], prototypes)
+        for i, chunk in enumerate(chunks)
+    ]
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Long-running similarity service.
+Keeps the prototype matrix in memory so n8n pays only for the scoring math,
+not for Python startup and a full subgenres.db load on every execution.
+
+Endpoints (all take the same chunk JSON as /tmp/n8n_chunks.json, or a binary
+chunk container, see chunk_container.py):
+    POST /score       -> list of per-chunk top-20 results
+    POST /aggregate   -> aggregated book result (same as similarity_with_aggregation.py)
+    GET  /stats       -> request counts and p50/p99 latency per endpoint
+
+With --int8, chunks are scored against the int8 copy of the matrix and the
+best RERANK rows re-ranked in float32 (quantized_matrix.py). This trades
+speed for memory: the first pass is slower than float32 scoring, but with a
+memory-mapped matrix only the int8 copy and the re-ranked rows stay resident.
+
+Example:
+    curl -s --data-binary @/tmp/n8n_chunks.json http://localhost:8766/aggregate
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import deque
+from urllib.parse import urlparse
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+
+from chunk_container import is_container, iter_container_chunks
+from genre_aggregator import aggregate_chunks
+from prototype_store import get_store
+from quantized_matrix import DEFAULT_RERANK
+from similarity_engine import calculate_similarity_for_chunks
+from subgenres_db import DB_PATH
+
+PORT = 8766
+
+# Latency samples kept per endpoint for percentile reporting
+LATENCY_WINDOW = 10000
+
+
+class LatencyStats:
+    """Thread-safe request counters and a rolling window of latencies per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counts = {}
+        self._errors = {}
+        self.started = time.time()
+
+    def record(self, endpoint, seconds, ok=True):
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=LATENCY_WINDOW)).append(seconds * 1000)
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+            if not ok:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, samples in self._samples.items():
+                p50, p99 = np.percentile(np.fromiter(samples, dtype=np.float64), [50, 99])
+                endpoints[endpoint] = {
+                    'requests': self._counts[endpoint],
+                    'errors': self._errors.get(endpoint, 0),
+                    'p50_ms': round(float(p50), 3),
+                    'p99_ms': round(float(p99), 3)
+                }
+        return {'uptime_seconds': round(time.time() - self.started, 1), 'endpoints': endpoints}
+
+
+class SimilarityServer(ThreadingHTTPServer):
+    # Bursts of n8n executions connect at once; the default backlog of 5 drops them
+    request_queue_size = 128
+
+
+class SimilarityHandler(BaseHTTPRequestHandler):
+    store = None
+    stats = None
+    # Re-rank depth when scoring with the int8 matrix; exact float32 when None
+    rerank = None
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_chunks(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if is_container(body):
+            return list(iter_container_chunks(body))
+        chunks = json.loads(body)
+        if not isinstance(chunks, list):
+            chunks = [chunks]
+        return chunks
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/stats':
+            stats = self.stats.snapshot()
+            stats['prototypes'] = {
+                'db_path': str(self.store.db_path),
+                'count': self.store.count,
+                'db_mtime': self.store.mtime,
+                'loads': self.store.loads,
+                'source': self.store.source
+            }
+            if self.rerank is not None:
+                stats['prototypes']['int8'] = {'rerank': self.rerank, 'bytes': self.store.quantized().nbytes}
+            self.send_json(200, stats)
+        else:
+            self.send_json(404, {'error': f'Unknown endpoint {path}'})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path not in ('/score', '/aggregate'):
+            self.send_json(404, {'error': f'Unknown endpoint {path}'})
+            return
+
+        start = time.perf_counter()
+        ok = True
+        try:
+            chunks = self.read_chunks()
+            prototypes = self.store.get()
+            index = self.store.quantized() if self.rerank is not None else None
+            if path == '/score':
+                result = calculate_similarity_for_chunks(chunks, prototypes, index=index, nprobe=self.rerank)
+            else:
+                result = aggregate_chunks(chunks, prototypes, index=index, nprobe=self.rerank)
+            self.send_json(200, result)
+        except (ValueError, KeyError) as e:
+            ok = False
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            ok = False
+            self.send_json(500, {'error': str(e)})
+        finally:
+            self.stats.record(path, time.perf_counter() - start, ok)
+
+    def log_message(self, format, *args):
+        # Keep stdout quiet; latency is reported on /stats
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Similarity scoring service")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=PORT, help="Port to run on")
+    parser.add_argument("--db", default=str(DB_PATH), help="Path to subgenres.db")
+    parser.add_argument("--int8", type=int, nargs="?", const=DEFAULT_RERANK, metavar="RERANK",
+                        help=f"Score with the int8 matrix, re-ranking the best RERANK rows (default {DEFAULT_RERANK}). "
+                             f"Uses less resident memory but scores more slowly than float32")
+    args = parser.parse_args()
+    if args.int8 is not None and args.int8 < 1:
+        parser.error("--int8 must be at least 1")
+
+    SimilarityHandler.store = get_store(args.db)
+    SimilarityHandler.rerank = args.int8
+    SimilarityHandler.stats = LatencyStats()
+
+    # Load the prototypes up front so the first request doesn't pay for it
+    prototypes = SimilarityHandler.store.get()
+    if args.int8 is not None:
+        SimilarityHandler.store.quantized()
+
+    server = SimilarityServer((args.host, args.port), SimilarityHandler)
+    print(f'🧮 Loaded {len(prototypes)} subgenres from {args.db}')
+    print(f'🌐 Scoring service at http://{args.host}:{args.port} (/score, /aggregate, /stats)')
+    print('Press Ctrl+C to stop')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
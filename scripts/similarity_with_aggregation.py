@@ -2,140 +2,106 @@
 """
 Calculate similarity and aggregate results in one step.
 Outputs compact aggregated JSON instead of full JSONL.
+
+Chunks are streamed from the input file (JSON array, JSONL or binary
+container) and scored in fixed-size micro-batches, so memory stays flat
+regardless of book length.
+With --book-id, chunks and embeddings come from the chunk store instead
+(chunk_store.py); --save adds the input file's chunks to the store.
 """
-import sqlite3
+import argparse
 import json
 import sys
 import os
-import math
-from collections import defaultdict
 
-def cosine_similarity(vec1, vec2):
-    """Calculate cosine similarity between two vectors (pure Python)."""
-    if len(vec1) != len(vec2):
-        raise ValueError(f"Vector length mismatch: {len(vec1)} vs {len(vec2)}")
-    
-    dot_product = sum(a * b for a, b in zip(vec1, vec2))
-    norm1 = math.sqrt(sum(a * a for a in vec1))
-    norm2 = math.sqrt(sum(b * b for b in vec2))
-    
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-    
-    return dot_product / (norm1 * norm2)
+from ann_index import load_index
+from chunk_reader import BATCH_SIZE, CHUNKS_FILES, default_chunks_file, iter_batches, iter_chunks
+from chunk_store import chunk_texts_id, get_chunk_store
+from genre_aggregator import GenreAggregator
+from hierarchical_scoring import DEFAULT_FANOUT, parent_index
+from parallel_scoring import aggregate_parallel
+from prototype_store import get_store
+from subgenres_db import DEFAULT_MODEL
+
+def save_chunks(chunks_file, chunks, model):
+    """Pass chunks through while storing them under the id of the file's chunk texts."""
+    book_id = chunk_texts_id(iter_chunks(chunks_file))
+    store = get_chunk_store()
+    first = True
+    for batch in iter_batches(chunks):
+        if first:
+            store.begin_book(book_id, model, batch[0].get('book_title', 'Unknown'), {})
+            first = False
+        store.add_chunks(book_id, model, batch)
+        yield from batch
+    print(f"Stored chunks as book {book_id[:12]}", file=sys.stderr)
 
 def main():
+    parser = argparse.ArgumentParser(description="Score chunks and aggregate genre votes")
+    parser.add_argument("--input", help=f"Chunks file (JSON array, JSONL or binary container; "
+                                         f"default: the newer of {' and '.join(CHUNKS_FILES)})")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Chunks scored per matrix product")
+    parser.add_argument("--workers", type=int, default=1, help="Score batches on N worker processes")
+    parser.add_argument("--ann", type=int, metavar="NPROBE",
+                        help="Score with the IVF index (ann_index.py), probing NPROBE clusters per chunk")
+    parser.add_argument("--hierarchical", type=int, nargs="?", const=DEFAULT_FANOUT, metavar="FANOUT",
+                        help=f"Score parent genres first, then subgenres of the top FANOUT parents "
+                             f"(default {DEFAULT_FANOUT}; see hierarchical_scoring.py)")
+    parser.add_argument("--book-id", help="Score a book from the chunk store (id or unique prefix)")
+    parser.add_argument("--save", action="store_true", help="Also store the input chunks in the chunk store")
+    parser.add_argument("--model", help=f"Embedding model of the chunks (stored as {DEFAULT_MODEL} with --save)")
+    args = parser.parse_args()
+    modes = {'--ann': args.ann, '--hierarchical': args.hierarchical}
+    for flag, value in modes.items():
+        if value is not None and value < 1:
+            parser.error(f"{flag} must be at least 1")
+    selected = [flag for flag, value in modes.items() if value is not None]
+    if selected and args.workers > 1:
+        parser.error("--ann and --hierarchical are only supported with a single worker")
+    if len(selected) > 1:
+        parser.error("Only one of --ann and --hierarchical can be used")
+    if args.book_id and args.save:
+        parser.error("--save stores chunks from --input; it can't be combined with --book-id")
+    
     try:
         # Read chunks from temp file
-        chunks_file = '/tmp/n8n_chunks.json'
+        chunks_file = args.input or default_chunks_file()
         
-        if not os.path.exists(chunks_file):
+        if not args.book_id and not os.path.exists(chunks_file):
             raise ValueError(f"Chunks file not found at {chunks_file}")
         
-        with open(chunks_file, 'r') as f:
-            chunks = json.load(f)
-        
-        if not isinstance(chunks, list):
-            chunks = [chunks]
-        
-        print(f"Processing {len(chunks)} chunks...", file=sys.stderr)
-        
-        # Connect to database
-        conn = sqlite3.connect('/Users/eerogetlost/book-processor-local/data/subgenres.db')
-        cursor = conn.cursor()
-        
         # Load all genres once
-        cursor.execute('SELECT id, parent_genre, sub_genre, prototype_text, embedding FROM subgenres')
-        genres = cursor.fetchall()
-        
-        print(f"Loaded {len(genres)} genres from database", file=sys.stderr)
-        
-        # Aggregate results
-        genre_votes = defaultdict(lambda: {'votes': 0, 'scores': [], 'parent': '', 'prototype': ''})
-        chunk_details = []
-        book_title = chunks[0].get('book_title', 'Unknown') if chunks else 'Unknown'
-        
-        # Process each chunk
-        for chunk_idx, chunk_data in enumerate(chunks):
-            book_embedding = chunk_data['embedding']
-            chunk_num = chunk_data.get('chunk_number', chunk_idx + 1)
-            chunk_text = chunk_data.get('chunk_text', '')
-            
-            # Calculate similarities for this chunk
-            chunk_top_genres = []
-            
-            for genre_row in genres:
-                genre_id, parent, subgenre, prototype, genre_embedding_json = genre_row
-                genre_embedding = json.loads(genre_embedding_json)
-                
-                similarity = cosine_similarity(book_embedding, genre_embedding)
-                
-                chunk_top_genres.append({
-                    'subgenre': subgenre,
-                    'parent_genre': parent,
-                    'similarity': similarity,
-                    'prototype_text': prototype
-                })
-            
-            # Sort and get top 20 for this chunk
-            chunk_top_genres.sort(key=lambda x: x['similarity'], reverse=True)
-            top_20 = chunk_top_genres[:20]
-            
-            # Store chunk details (top 5 for display)
-            chunk_details.append({
-                'chunk_number': chunk_num,
-                'chunk_preview': chunk_text[:150],
-                'top_5_genres': [
-                    {
-                        'subgenre': g['subgenre'],
-                        'parent': g['parent_genre'],
-                        'similarity': g['similarity']
-                    } for g in top_20[:5]
-                ]
-            })
-            
-            # Aggregate votes for top 20
-            for genre in top_20:
-                key = genre['subgenre']
-                genre_votes[key]['votes'] += 1
-                genre_votes[key]['scores'].append(genre['similarity'])
-                genre_votes[key]['parent'] = genre['parent_genre']
-                genre_votes[key]['prototype'] = genre['prototype_text']
-            
-            if (chunk_idx + 1) % 10 == 0:
-                print(f"Processed {chunk_idx + 1}/{len(chunks)} chunks", file=sys.stderr)
-        
-        conn.close()
-        
-        # Calculate averages and prepare final output
-        genre_matches = {}
-        for subgenre, data in genre_votes.items():
-            genre_matches[subgenre] = {
-                'subgenre': subgenre,
-                'parent': data['parent'],
-                'prototype_text': data['prototype'],
-                'votes': data['votes'],
-                'avg_similarity': sum(data['scores']) / len(data['scores'])
-            }
-        
-        # Sort by votes and similarity
-        sorted_genres = sorted(
-            genre_matches.values(),
-            key=lambda x: (x['votes'], x['avg_similarity']),
-            reverse=True
-        )
-        
-        # Sort chunk details
-        chunk_details.sort(key=lambda x: x['chunk_number'])
-        
-        # Output compact aggregated result
-        result = {
-            'book_title': book_title,
-            'total_chunks': len(chunks),
-            'top_20_genres': sorted_genres[:20],
-            'chunk_details': chunk_details,
-            'processing_complete': True
-        }
+        store = get_store()
+        prototypes = store.get()
+        index = None
+        nprobe = None
+        if args.ann is not None:
+            index, nprobe = load_index(store), args.ann
+        elif args.hierarchical is not None:
+            index, nprobe = parent_index(prototypes, store.mtime), args.hierarchical
+        
+        print(f"Loaded {len(prototypes)} genres from database", file=sys.stderr)
+        
+        # Score and aggregate one micro-batch at a time
+        if args.book_id:
+            chunks = get_chunk_store().iter_chunks(args.book_id, args.model)
+        else:
+            chunks = iter_chunks(chunks_file)
+        if args.save:
+            chunks = save_chunks(chunks_file, chunks, args.model or DEFAULT_MODEL)
+        batches = iter_batches(chunks, args.batch_size)
+        if args.workers > 1:
+            aggregator = aggregate_parallel(
+                batches, prototypes, args.workers,
+                progress=lambda n: print(f"Processed {n} chunks", file=sys.stderr)
+            )
+        else:
+            aggregator = GenreAggregator(len(prototypes), index=index, nprobe=nprobe)
+            for batch in batches:
+                aggregator.add_batch(batch, prototypes)
+                print(f"Processed {aggregator.total_chunks} chunks", file=sys.stderr)
+        
+        result = aggregator.result(prototypes)
         
         print(json.dumps(result, separators=(',', ':')))
         sys.exit(0)
@@ -146,4 +112,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
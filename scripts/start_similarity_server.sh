@@ -0,0 +1,24 @@
+#!/bin/bash
+
+# Start the long-running similarity service
+
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+PORT="${SIMILARITY_PORT:-8766}"
+
+echo "🧮 Starting Similarity Service"
+echo "================================================"
+echo ""
+
+python3 -c "import numpy" 2>/dev/null || {
+    echo "📦 Installing dependencies..."
+    pip install numpy
+}
+
+echo "🧮 Score chunks:     POST http://localhost:$PORT/score"
+echo "📊 Aggregate a book: POST http://localhost:$PORT/aggregate"
+echo "⏱  Latency stats:    GET  http://localhost:$PORT/stats"
+echo ""
+echo "Press Ctrl+C to stop"
+echo ""
+
+python3 "$SCRIPT_DIR/similarity_server.py" --port "$PORT" "$@"
@@ -15,9 +15,9 @@ else
 fi
 
 # Check if dependencies are installed
-python3 -c "import fastapi, uvicorn, requests" 2>/dev/null || {
+python3 -c "import fastapi, uvicorn, httpx, numpy" 2>/dev/null || {
     echo "📦 Installing dependencies..."
-    pip install fastapi uvicorn requests python-multipart
+    pip install fastapi uvicorn httpx python-multipart numpy
 }
 
 echo ""
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Storage helpers for subgenres.db.
+Prototype embeddings are stored as little-endian float32 BLOBs with their
+dimension and model, so loading a vector is a buffer view instead of a
+JSON parse. Legacy JSON-text rows are still readable.
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DB_PATH = Path(os.getenv("SUBGENRES_DB", DATA_DIR / "subgenres.db"))
+SUBGENRES_FILE = DATA_DIR / "subgenres.json"
+
+EMBEDDING_DTYPE = np.dtype('<f4')
+DEFAULT_MODEL = "snowflake-arctic-embed"
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY,
+    parent_genre TEXT NOT NULL,
+    sub_genre TEXT NOT NULL,
+    prototype_text TEXT,
+    embedding BLOB,
+    embedding_dim INTEGER,
+    embedding_model TEXT
+)
+'''
+
+
+def db_mtime(db_path=DB_PATH):
+    """Latest modification time (ns) of a SQLite DB, including its WAL file if present."""
+    mtime = os.stat(db_path).st_mtime_ns
+    wal = Path(f"{db_path}-wal")
+    if wal.exists():
+        mtime = max(mtime, wal.stat().st_mtime_ns)
+    return mtime
+
+
+def create_table(conn, table='subgenres'):
+    """Create a subgenres table with the binary embedding schema."""
+    conn.execute(SCHEMA.format(table=table))
+
+
+def pack_embedding(vector):
+    """Pack a vector as a little-endian float32 BLOB."""
+    return np.asarray(vector, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def unpack_embedding(blob):
+    """Read-only float32 view over a BLOB (no copy, no parse)."""
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+
+
+def decode_embedding(value):
+    """Decode an embedding column that is either a float32 BLOB or legacy JSON text."""
+    if value is None:
+        return None
+    if isinstance(value, (bytes, memoryview)):
+        return unpack_embedding(value)
+    return np.asarray(json.loads(value), dtype=EMBEDDING_DTYPE)
+
+
+def table_columns(conn, table='subgenres'):
+    """Column names of a table (empty list if it does not exist)."""
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def is_binary_schema(conn):
+    """True once the subgenres table has been migrated to float32 BLOBs."""
+    return 'embedding_dim' in table_columns(conn)
+
+
+def insert_subgenres(conn, subgenres, model=DEFAULT_MODEL, table='subgenres'):
+    """Insert subgenre dicts (parent_genre, sub_genre, prototype_text, embedding)."""
+    rows = []
+    for genre in subgenres:
+        embedding = genre.get('embedding')
+        if embedding is None:
+            blob, dims = None, None
+        else:
+            blob = pack_embedding(embedding)
+            dims = len(blob) // EMBEDDING_DTYPE.itemsize
+        rows.append((
+            genre.get('id'),
+            genre['parent_genre'],
+            genre['sub_genre'],
+            genre.get('prototype_text'),
+            blob,
+            dims,
+            model
+        ))
+
+    conn.executemany(
+        f'INSERT INTO {table} (id, parent_genre, sub_genre, prototype_text, embedding, embedding_dim, embedding_model) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        rows
+    )
+    return len(rows)
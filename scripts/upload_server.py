@@ -2,18 +2,42 @@
 """
 Simple upload server for testing manuscript workflows.
 Provides a web interface to upload PDFs and automatically triggers the n8n webhook.
+
+Uploads are streamed to disk in fixed-size blocks while their sha256 is
+computed. The webhook gets a reference to the stored file (URL, path, size,
+sha256) instead of the file contents. The file itself is served by /files/{filename}.
+
+Webhook calls are queued as jobs and sent by a fixed pool of async workers
+sharing one pooled HTTP client. /upload returns the job id right away and
+/jobs/{id} reports its progress.
+
+Uploads are stored under their content hash. Finished reports are kept in
+the result store (result_store.py), keyed by file hash, chunking config,
+embedding model and taxonomy version. Uploading the same manuscript again
+returns the stored report at once instead of re-running the workflow;
+send force=true to recompute. The workflow posts its final report to the
+callback_url it receives. Keys waiting for that callback are recorded in
+the result store, so a report posted after a restart is still accepted.
 """
 
-from fastapi import FastAPI, File, UploadFile, Form
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, UploadFile, Form, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
 import uvicorn
+import asyncio
+import hashlib
+import httpx
+import mimetypes
 import os
-import requests
+import time
 from pathlib import Path
 import uuid
 
-app = FastAPI(title="Manuscript Upload Server")
+from embedding_config import EMBEDDING_MODEL
+from prototype_store import get_store
+from result_store import chunking_config, get_result_store, result_key
 
 # Directory to store uploaded files
 UPLOAD_DIR = Path("/tmp/manuscript-uploads")
@@ -22,6 +46,129 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 # n8n webhook URL (will be configurable)
 N8N_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL", "http://localhost:5678/webhook/master-book-processor-webhook")
 
+# Base URL the webhook uses to fetch stored files back from this server
+PUBLIC_URL = os.getenv("UPLOAD_PUBLIC_URL", "http://localhost:3000")
+
+# Bytes copied (and hashed) per block; memory per upload stays at one block
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# Webhook calls in flight at once, jobs waiting beyond that, and jobs remembered for /jobs
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", 4))
+MAX_QUEUED_JOBS = 1000
+JOB_HISTORY = 1000
+WEBHOOK_TIMEOUT = 10
+
+jobs = OrderedDict()
+job_queue = None
+http_client = None
+
+async def webhook_worker():
+    """Send queued webhook calls one at a time, recording the outcome on the job."""
+    while True:
+        job_id, webhook_url, payload = await job_queue.get()
+        job = jobs[job_id]
+        job.update(status="running", started_at=time.time())
+        try:
+            response = await http_client.post(webhook_url, json=payload)
+            job["webhook_status"] = response.status_code
+            if response.status_code in [200, 201, 202]:
+                job["status"] = "done"
+            else:
+                job.update(status="failed", error=f"Webhook returned HTTP {response.status_code}")
+        except Exception as e:
+            job.update(status="failed", error=str(e) or type(e).__name__)
+            print(f"Webhook call failed: {e}")
+        finally:
+            job["finished_at"] = time.time()
+            job_queue.task_done()
+
+def submit_job(webhook_url, payload, **info):
+    """Queue a webhook call; returns the job record (raises asyncio.QueueFull when saturated)."""
+    job = {
+        "id": uuid.uuid4().hex,
+        "status": "queued",
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "webhook_status": None,
+        "error": None,
+        "result_ready": False,
+        **info
+    }
+    job_queue.put_nowait((job["id"], webhook_url, payload))
+    jobs[job["id"]] = job
+    
+    # Forget the oldest finished jobs
+    for job_id in list(jobs):
+        if len(jobs) <= JOB_HISTORY:
+            break
+        if jobs[job_id]["finished_at"] is not None:
+            del jobs[job_id]
+    return job
+
+@asynccontextmanager
+async def lifespan(app):
+    """Start the webhook workers and the shared HTTP client; stop them on shutdown."""
+    global job_queue, http_client
+    job_queue = asyncio.Queue(MAX_QUEUED_JOBS)
+    http_client = httpx.AsyncClient(
+        timeout=WEBHOOK_TIMEOUT,
+        limits=httpx.Limits(max_connections=WEBHOOK_CONCURRENCY, max_keepalive_connections=WEBHOOK_CONCURRENCY)
+    )
+    workers = [asyncio.create_task(webhook_worker()) for _ in range(WEBHOOK_CONCURRENCY)]
+    try:
+        yield
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await http_client.aclose()
+
+app = FastAPI(title="Manuscript Upload Server", lifespan=lifespan)
+
+def save_upload(source, suffix):
+    """
+    Copy an upload into UPLOAD_DIR block by block, hashing as it goes, and
+    store it as <sha256><suffix>. Written under a temporary name and renamed
+    when complete, so /files never serves a partial file; an identical file
+    already on disk is kept. Returns (file_path, size, sha256 hex digest).
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    partial_path = UPLOAD_DIR / f"{uuid.uuid4()}.part"
+    try:
+        with open(partial_path, 'wb') as f:
+            while True:
+                block = source.read(COPY_BLOCK_SIZE)
+                if not block:
+                    break
+                sha256.update(block)
+                f.write(block)
+                size += len(block)
+        file_path = UPLOAD_DIR / f"{sha256.hexdigest()}{suffix.lower()}"
+        if file_path.exists():
+            # Same content; refresh mtime so /cleanup keeps it
+            os.utime(file_path)
+        else:
+            os.replace(partial_path, file_path)
+    finally:
+        if partial_path.exists():
+            partial_path.unlink()
+    return file_path, size, sha256.hexdigest()
+
+def result_lookup(sha256):
+    """
+    (result_key, metadata) for an upload under the current chunking defaults,
+    embedding model and taxonomy; (None, None) when subgenres.db is missing.
+    """
+    store = get_store()
+    if not store.db_path.exists():
+        return None, None
+    chunking = chunking_config()
+    version = store.version
+    meta = {"file_sha256": sha256, "chunking": chunking, "model": EMBEDDING_MODEL, "taxonomy_version": version}
+    return result_key(sha256, chunking, EMBEDDING_MODEL, version), meta
+
 @app.get("/", response_class=HTMLResponse)
 async def upload_form():
     """Serve the upload form."""
@@ -121,9 +268,10 @@ async def upload_form():
         
         <form id="uploadForm" enctype="multipart/form-data">
             <div class="upload-area">
-                <p>📄 Choose your manuscript PDF</p>
-                <input type="file" id="fileInput" name="file" accept=".pdf" required>
+                <p>📄 Choose your manuscript (PDF or .txt)</p>
+                <input type="file" id="fileInput" name="file" accept=".pdf,.txt" required>
             </div>
+            <label><input type="checkbox" id="forceInput"> Re-process even if this manuscript was analysed before</label><br>
             <button type="submit">Upload & Process</button>
         </form>
         
@@ -154,6 +302,7 @@ async def upload_form():
                 const formData = new FormData();
                 formData.append('file', file);
                 formData.append('webhook_url', webhookUrl);
+                formData.append('force', document.getElementById('forceInput').checked);
                 
                 const response = await fetch('/upload', {
                     method: 'POST',
@@ -162,14 +311,22 @@ async def upload_form():
                 
                 const result = await response.json();
                 
-                if (result.success) {
+                if (result.success && result.cached) {
+                    statusDiv.className = 'status success';
+                    statusDiv.innerHTML = `
+                        ✅ <strong>Already processed!</strong><br><br>
+                        File: ${file.name}<br>
+                        Top genre: ${result.result.top_20_genres?.[0]?.subgenre || 'n/a'}<br><br>
+                        Stored report: <a href="/results/${result.result_key}" target="_blank">${result.result_key.slice(0, 12)}</a>
+                    `;
+                } else if (result.success) {
                     statusDiv.className = 'status success';
                     statusDiv.innerHTML = `
                         ✅ <strong>Upload successful!</strong><br><br>
                         File: ${file.name}<br>
                         Stored at: ${result.file_url}<br><br>
-                        <strong>Webhook triggered!</strong><br>
-                        Processing in n8n...<br><br>
+                        <strong>Webhook queued!</strong><br>
+                        Job status: <a href="${result.job_url}" target="_blank">${result.job_id}</a><br><br>
                         Check results at: <a href="http://localhost:5678" target="_blank">n8n Dashboard</a>
                     `;
                 } else {
@@ -187,56 +344,89 @@ async def upload_form():
 """
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...), webhook_url: str = Form(...)):
-    """Handle file upload and trigger webhook."""
+async def upload_file(file: UploadFile = File(...), webhook_url: str = Form(...), force: bool = Form(False)):
+    """Handle file upload and trigger webhook (or return the stored report for a known file)."""
     
     try:
-        # Generate unique filename
-        file_id = str(uuid.uuid4())
-        file_ext = Path(file.filename).suffix
-        stored_filename = f"{file_id}{file_ext}"
-        file_path = UPLOAD_DIR / stored_filename
+        # Stream the spooled upload to disk off the event loop
+        file_path, size, sha256 = await run_in_threadpool(save_upload, file.file, Path(file.filename).suffix)
+        file_url = f"{PUBLIC_URL}/files/{file_path.name}"
         
-        # Read file contents
-        contents = await file.read()
+        # Same file, settings and taxonomy as a finished run: answer from the result store
+        key, meta = await run_in_threadpool(result_lookup, sha256)
+        if key and not force:
+            stored = get_result_store().get(key)
+            if stored is not None:
+                return JSONResponse({
+                    "success": True,
+                    "cached": True,
+                    "filename": file.filename,
+                    "file_url": file_url,
+                    "sha256": sha256,
+                    "result_key": key,
+                    "result": stored,
+                    "message": "This manuscript was already processed; returning the stored report."
+                })
+            pending = get_result_store().pending(key)
+            if pending is not None and pending["job_id"] in jobs:
+                job_id = pending["job_id"]
+                return JSONResponse({
+                    "success": True,
+                    "cached": False,
+                    "deduplicated": True,
+                    "filename": file.filename,
+                    "file_url": file_url,
+                    "sha256": sha256,
+                    "result_key": key,
+                    "job_id": job_id,
+                    "job_url": f"/jobs/{job_id}",
+                    "message": "This manuscript is already being processed."
+                }, status_code=202)
         
-        # Save the file locally as backup
-        with open(file_path, 'wb') as f:
-            f.write(contents)
-        
-        # Convert to base64 for sending in webhook
-        import base64
-        base64_data = base64.b64encode(contents).decode('utf-8')
-        
-        # Trigger the n8n webhook with base64 PDF data
+        # Trigger the n8n webhook with a reference to the stored file
         webhook_data = {
             "data": {
                 "file": {
                     "name": file.filename,
-                    "type": "application/pdf",
-                    "data": base64_data,
-                    "size": len(contents)
+                    "type": file.content_type or "application/pdf",
+                    "url": file_url,
+                    "path": str(file_path),
+                    "size": size,
+                    "sha256": sha256
                 },
                 "book_title": Path(file.filename).stem
             }
         }
+        if key:
+            webhook_data["data"]["result_key"] = key
+            webhook_data["data"]["callback_url"] = f"{PUBLIC_URL}/results/{key}"
         
-        # Call the webhook
+        # Queue the webhook call; a worker sends it in the background
         try:
-            webhook_response = requests.post(webhook_url, json=webhook_data, timeout=10)
-            webhook_success = webhook_response.status_code in [200, 201, 202]
-        except Exception as e:
-            webhook_success = False
-            print(f"Webhook call failed: {e}")
+            job = submit_job(webhook_url, webhook_data, filename=file.filename, file_url=file_url, result_key=key)
+        except asyncio.QueueFull:
+            return JSONResponse({
+                "success": False,
+                "error": "Too many uploads waiting for the webhook, try again shortly",
+                "file_url": file_url
+            }, status_code=503)
+        
+        if key:
+            await run_in_threadpool(lambda: get_result_store().add_pending(key, job_id=job["id"], **meta))
         
         return JSONResponse({
             "success": True,
+            "cached": False,
             "filename": file.filename,
             "file_url": file_url,
             "file_path": str(file_path),
-            "webhook_triggered": webhook_success,
-            "message": "File uploaded successfully! Processing started in n8n."
-        })
+            "size": size,
+            "sha256": sha256,
+            "result_key": key,
+            "job_id": job["id"],
+            "job_url": f"/jobs/{job['id']}",
+            "message": "File uploaded successfully! Webhook queued for n8n."
+        }, status_code=202)
         
     except Exception as e:
         return JSONResponse({
@@ -249,11 +439,42 @@ async def serve_file(filename: str):
     """Serve uploaded files."""
     file_path = UPLOAD_DIR / filename
     
-    if not file_path.exists():
+    # Only plain names inside UPLOAD_DIR; never half-written uploads
+    if Path(filename).name != filename or filename.endswith(".part") or not file_path.is_file():
         return JSONResponse({"error": "File not found"}, status_code=404)
     
-    from fastapi.responses import FileResponse
-    return FileResponse(file_path, media_type="application/pdf", filename=filename)
+    media_type = mimetypes.guess_type(filename)[0] or "application/pdf"
+    return FileResponse(file_path, media_type=media_type, filename=filename)
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Progress of a queued webhook call."""
+    job = jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return job
+
+@app.post("/results/{key}")
+async def store_result(key: str, request: Request):
+    """Callback for the workflow: store the final report of a queued upload."""
+    store = get_result_store()
+    pending = await run_in_threadpool(store.pending, key)
+    if pending is None:
+        return JSONResponse({"error": "No upload is waiting for this result"}, status_code=404)
+    result = await request.json()
+    job_id = pending.pop("job_id")
+    await run_in_threadpool(lambda: store.put(key, result=result, **pending))
+    if job_id in jobs:
+        jobs[job_id]["result_ready"] = True
+    return {"stored": True, "result_key": key}
+
+@app.get("/results/{key}")
+async def get_result(key: str):
+    """A stored report."""
+    result = get_result_store().get(key)
+    if result is None:
+        return JSONResponse({"error": "Result not found"}, status_code=404)
+    return result
 
 @app.get("/status")
 async def status():
@@ -263,6 +484,8 @@ async def status():
         "status": "running",
         "upload_dir": str(UPLOAD_DIR),
         "files_stored": len(files),
+        "jobs_queued": job_queue.qsize() if job_queue else 0,
+        "jobs_running": sum(1 for job in jobs.values() if job["status"] == "running"),
         "n8n_webhook": N8N_WEBHOOK_URL
     }
 
@@ -291,6 +514,8 @@ if __name__ == "__main__":
     
     if args.webhook:
         N8N_WEBHOOK_URL = args.webhook
+    if "UPLOAD_PUBLIC_URL" not in os.environ:
+        PUBLIC_URL = f"http://localhost:{args.port}"
     
     print("=" * 60)
     print("📚 Manuscript Upload Server")
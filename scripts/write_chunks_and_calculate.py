@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 """
-Wrapper script to get chunk data from n8n temp file and calculate similarity.
-This reads from /tmp/n8n_chunks.jsonl written by n8n.
+Get chunk data from n8n temp file and calculate similarity.
+This reads from /tmp/n8n_chunks.jsonl written by n8n and scores it
+in-process (no second interpreter).
 """
 import sys
 import os
+import json
+
+from calculate_similarity_sqlite import BATCH_SIZE, write_results
+from prototype_store import load_prototypes
 
 # Read chunks from temp file (written by n8n)
 chunks_file = '/tmp/n8n_chunks.jsonl'
@@ -13,20 +18,24 @@ if not os.path.exists(chunks_file):
     print(json.dumps({'error': 'No chunks file found at /tmp/n8n_chunks.jsonl'}), file=sys.stderr)
     sys.exit(1)
 
-# Pipe chunks to similarity calculator
-import subprocess
-result = subprocess.run(
-    ['python3', '/Users/eerogetlost/book-processor-local/scripts/calculate_similarity_sqlite.py'],
-    stdin=open(chunks_file, 'r'),
-    stdout=subprocess.PIPE,
-    stderr=subprocess.PIPE,
-    text=True
-)
-
-# Output results
-print(result.stdout, end='')
-if result.stderr:
-    print(result.stderr, file=sys.stderr)
-
-sys.exit(result.returncode)
-
+try:
+    prototypes = load_prototypes()
+    
+    batch = []
+    with open(chunks_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            batch.append(json.loads(line))
+            if len(batch) >= BATCH_SIZE:
+                write_results(batch, prototypes)
+                batch = []
+    
+    if batch:
+        write_results(batch, prototypes)
+    
+    sys.exit(0)
+except Exception as e:
+    print(json.dumps({'error': str(e)}), file=sys.stderr)
+    sys.exit(1)
@@ -0,0 +1,45 @@
+"""
+Round trips through the binary chunk container (chunk_container.py).
+
+Run from the repository root:
+    python3 -m pytest -q tests
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from chunk_container import is_container, iter_container, write_container
+
+
+def round_trip(path, chunks):
+    assert write_container(path, chunks) == len(chunks)
+    assert is_container(path)
+    return [
+        dict(chunk, embedding=np.array(chunk['embedding']).tolist())
+        for chunk in iter_container(path)
+    ]
+
+
+def test_chunk_without_title(tmp_path):
+    chunks = [{'chunk_number': 1, 'chunk_text': 'a', 'embedding': [1.0, 2.0]}]
+    assert round_trip(tmp_path / 'chunks.bin', chunks) == chunks
+
+
+def test_chunk_with_different_title(tmp_path):
+    chunks = [
+        {'chunk_number': 1, 'book_title': 'First', 'chunk_text': 'ä', 'word_count': 1, 'embedding': [1.0, 2.0]},
+        {'chunk_number': 2, 'book_title': 'Second', 'chunk_text': 'bc', 'word_count': 1, 'embedding': [3.0, 4.0]},
+        {'chunk_number': 3, 'book_title': 'First', 'chunk_text': '', 'word_count': 0, 'embedding': [5.0, 6.0]}
+    ]
+    assert round_trip(tmp_path / 'chunks.bin', chunks) == chunks
+
+
+def test_chunk_without_embedding_is_rejected(tmp_path):
+    path = tmp_path / 'chunks.bin'
+    with pytest.raises(ValueError):
+        write_container(path, [{'chunk_number': 1, 'chunk_text': 'a', 'embedding': []}])
+    assert not path.exists()
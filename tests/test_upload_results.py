@@ -0,0 +1,143 @@
+"""
+Upload -> workflow callback -> cached re-upload round trip through
+upload_server.py, with the n8n webhook replaced by a mock transport.
+
+Run from the repository root:
+    python3 -m pytest -q tests
+"""
+import importlib
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+WEBHOOK_URL = "http://n8n.test/webhook/master-book-processor-webhook"
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """upload_server with a small subgenres.db, its own result store and a recording webhook."""
+    db_path = tmp_path / "subgenres.db"
+    monkeypatch.setenv("SUBGENRES_DB", str(db_path))
+    monkeypatch.setenv("RESULT_STORE", str(tmp_path / "results.db"))
+    monkeypatch.syspath_prepend(str(SCRIPTS_DIR))
+    # Module-level paths are read from the environment at import time
+    for name in ("subgenres_db", "prototype_matrix", "prototype_store", "result_store", "upload_server"):
+        sys.modules.pop(name, None)
+
+    subgenres_db = importlib.import_module("subgenres_db")
+    conn = sqlite3.connect(db_path)
+    subgenres_db.create_table(conn)
+    rng = np.random.default_rng(0)
+    subgenres_db.insert_subgenres(conn, [
+        {"id": i + 1, "parent_genre": "Fantasy", "sub_genre": f"Sub {i}",
+         "prototype_text": f"Prototype {i}", "embedding": rng.standard_normal(8)}
+        for i in range(4)
+    ])
+    conn.commit()
+    conn.close()
+
+    upload_server = importlib.import_module("upload_server")
+    webhook_calls = []
+
+    def webhook(request):
+        webhook_calls.append(request)
+        return httpx.Response(200, json={"status": "processing_started"})
+
+    # Lifespan creates (and closes) the shared client; give it the mock transport
+    async_client = httpx.AsyncClient
+    monkeypatch.setattr(httpx, "AsyncClient",
+                        lambda **kwargs: async_client(transport=httpx.MockTransport(webhook), **kwargs))
+    with TestClient(upload_server.app) as client:
+        yield upload_server, client, webhook_calls
+
+
+def upload(client, content, force=False):
+    return client.post(
+        "/upload",
+        files={"file": ("book.txt", content, "text/plain")},
+        data={"webhook_url": WEBHOOK_URL, "force": str(force).lower()}
+    )
+
+
+def wait_for_job(client, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def callback_path(upload_server, webhook_request):
+    """The callback_url the workflow received, relative to the upload server."""
+    data = httpx.Response(200, content=webhook_request.content).json()["data"]
+    assert data["callback_url"] == f"{upload_server.PUBLIC_URL}/results/{data['result_key']}"
+    return data["callback_url"][len(upload_server.PUBLIC_URL):], data["result_key"]
+
+
+def test_callback_result_is_returned_on_reupload(server):
+    upload_server, client, webhook_calls = server
+    content = b"A manuscript about dragons. " * 50
+
+    first = upload(client, content)
+    assert first.status_code == 202
+    assert first.json()["cached"] is False
+    assert wait_for_job(client, first.json()["job_id"])["status"] == "done"
+
+    path, key = callback_path(upload_server, webhook_calls[0])
+    assert key == first.json()["result_key"]
+
+    # Same file again while the workflow is still running: the existing job
+    in_flight = upload(client, content)
+    assert in_flight.json()["deduplicated"] is True
+    assert in_flight.json()["job_id"] == first.json()["job_id"]
+    assert len(webhook_calls) == 1
+
+    report = {"book_title": "book", "total_chunks": 1, "top_20_genres": [{"subgenre": "Sub 2", "votes": 1}]}
+    stored = client.post(path, json=report)
+    assert stored.status_code == 200
+    assert client.get(f"/jobs/{first.json()['job_id']}").json()["result_ready"] is True
+
+    again = upload(client, content)
+    assert again.status_code == 200
+    assert again.json()["cached"] is True
+    assert again.json()["result"] == report
+    assert client.get(f"/results/{key}").json() == report
+    assert len(webhook_calls) == 1
+
+    forced = upload(client, content, force=True)
+    assert forced.status_code == 202
+    wait_for_job(client, forced.json()["job_id"])
+    assert len(webhook_calls) == 2
+
+
+def test_callback_after_restart_is_stored(server):
+    upload_server, client, webhook_calls = server
+    content = b"A manuscript about detectives. " * 50
+
+    first = upload(client, content)
+    wait_for_job(client, first.json()["job_id"])
+    path, _ = callback_path(upload_server, webhook_calls[0])
+
+    # Restart: a fresh server process knows nothing about the upload
+    sys.modules["result_store"].get_result_store().close()
+    for name in ("result_store", "upload_server"):
+        sys.modules.pop(name)
+    restarted = importlib.import_module("upload_server")
+    with TestClient(restarted.app) as client:
+        report = {"book_title": "book", "total_chunks": 1, "top_20_genres": []}
+        assert client.post(path, json=report).status_code == 200
+        assert upload(client, content).json()["result"] == report
+
+
+def test_callback_for_unknown_key_is_rejected(server):
+    _, client, _ = server
+    assert client.post("/results/" + "0" * 64, json={"top_20_genres": []}).status_code == 404